@@ -0,0 +1,66 @@
+from fastapi import APIRouter, HTTPException, status, Request, Body
+from fastapi.responses import JSONResponse
+from pydantic import Field, BaseModel
+
+from booksum.service_route import SummaryMode
+
+router = APIRouter()
+
+
+class JobSchema(BaseModel):
+    book: str | None = Field(None, description="book title")
+    book_text: str | None = Field(None, description="book text")
+    mode: SummaryMode = Field('both', description="base (LLM), rag (LLM+RAG) or both responses")
+
+
+@router.post(
+    "/jobs",
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Enqueue a book or book text summarization.",
+    response_description="Returns the job id."
+  )
+async def submit_job(
+        request: Request,
+        body: JobSchema = Body(
+            ..., example={"book": "String", "mode": "both"}
+        )
+):
+    # one or the other, not both
+    if (body.book is None) == (body.book_text is None):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="A job summarizes either a book title or a book text."
+        )
+
+    jobs = request.app.state.jobs
+    if jobs.store.count('queued') >= request.app.state.settings['booksum_service']['booksum']['jobs']['max_queued']:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many queued jobs, retry later."
+        )
+
+    if body.book is not None:
+        job_id = jobs.store.submit('book-title', body.book, body.mode)
+    else:
+        job_id = jobs.store.submit('book-passage', body.book_text, body.mode)
+    jobs.notify()
+
+    return JSONResponse({"job_id": job_id, "status": "queued"}, status_code=status.HTTP_202_ACCEPTED)
+
+
+@router.get(
+    "/jobs/{job_id}",
+    status_code=status.HTTP_200_OK,
+    summary="Summarization job status.",
+    response_description="Returns the job status and, once done, its result."
+  )
+async def get_job(request: Request, job_id: str):
+    job = request.app.state.jobs.store.get(job_id)
+
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found."
+        )
+
+    return JSONResponse(job)
@@ -1,16 +1,25 @@
+import asyncio
 import logging
+import os
+import tempfile
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST
 
-from booksum import service_route
+from booksum import service_route, jobs_route
+from booksum.utils.instrumentation import MULTIPROC_DIR_ENV, mark_process_dead, metrics_payload, observe_threadpool
 from booksum.utils.io_ops import get_settings
-from booksum.utils.service_models import BookSumIndex
+from booksum.utils.jobs import JobStore, JobWorkerPool
+from booksum.utils.service_models import BookSumIndex, prepare_shared_index
 
 # todo: generalize the root-path
 srv_root_path = './'
 settings = get_settings(srv_root_path)
+# processes serving the app, they share the index (memory-mapped) prepared once by the parent
+srv_workers = int(settings['booksum_service']['booksum'].get('workers', 1))
 
 sum_logger = logging.getLogger()
 sum_logger.setLevel(logging.WARNING)
@@ -31,13 +40,39 @@ async def lifespan(my_app: FastAPI):
     themes_utils = (
         BookSumIndex(
             srv_root_path,
-            logger=sum_logger
+            logger=sum_logger,
+            workers=srv_workers
         )
     )
-    themes_utils.load_all_models()
     my_app.state.models = themes_utils
+
+    # workers draining the persisted summarization jobs (jobs are accepted while the models load)
+    jobs_cfg = settings['booksum_service']['booksum']['jobs']
+    # with several processes, the jobs left running by a previous run were queued again by the parent
+    my_app.state.jobs = JobWorkerPool(
+        JobStore(os.path.join(srv_root_path, jobs_cfg['path']), requeue_running=srv_workers == 1),
+        None,
+        workers=jobs_cfg['workers'],
+        logger=sum_logger
+    )
+
+    async def load_models():
+        # the app serves /health and /ready while the models and the index load in a thread
+        try:
+            await asyncio.to_thread(themes_utils.load_all_models)
+        except Exception:
+            sum_logger.exception("Loading the models failed.")
+            return
+
+        my_app.state.jobs.model = themes_utils.model
+        my_app.state.jobs.start()
+
+    loading = asyncio.create_task(load_models())
     yield
+    loading.cancel()
+    my_app.state.jobs.stop()
     my_app.state.settings = []
+    mark_process_dead()
 
 
 # -------------------------------------
@@ -62,16 +97,45 @@ async def health_check():
     return {"status": "UP"}
 
 
+# readiness probe: 503 until the models and the index are loaded
+@app.get("/ready", summary="Readiness Check", response_description="Loading progress of the models and the index")
+async def readiness_check():
+    models = app.state.models
+    return JSONResponse(models.progress(), status_code=200 if models.ready else 503)
+
+
+# prometheus metrics of the summarization stages
+@app.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+async def metrics():
+    observe_threadpool()
+    return Response(metrics_payload(), media_type=CONTENT_TYPE_LATEST)
+
+
 # Establish routers
 app.include_router(service_route.router)
+app.include_router(jobs_route.router)
 
 
 if __name__ == '__main__':
     port = settings['booksum_service']['booksum']['remote']['port']
     host = settings['booksum_service']['booksum']['remote']['host']
 
-    uvicorn.run(
-        app,
-        port=int(port),
-        host=host
-    )
+    if srv_workers > 1:
+        # built once here: the workers only map the persisted index read-only
+        prepare_shared_index(srv_root_path)
+        JobStore(os.path.join(srv_root_path, settings['booksum_service']['booksum']['jobs']['path']))
+        # metrics of every worker, aggregated by /metrics (the directory must start empty)
+        os.environ.setdefault(MULTIPROC_DIR_ENV, tempfile.mkdtemp(prefix='booksum-metrics-'))
+
+        uvicorn.run(
+            'booksum.service:app',
+            port=int(port),
+            host=host,
+            workers=srv_workers
+        )
+    else:
+        uvicorn.run(
+            app,
+            port=int(port),
+            host=host
+        )
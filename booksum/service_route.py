@@ -1,51 +1,98 @@
+import json
 import traceback
+from typing import Literal
 
-from fastapi import APIRouter, HTTPException, status, Request, Body
+from fastapi import APIRouter, HTTPException, status, Request, Body, Depends
 from fastapi.concurrency import run_in_threadpool
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import Field, BaseModel
 
 from booksum.utils.service_models import BookSumIndex
 
-router = APIRouter()
+
+def require_ready(request: Request) -> None:
+    """503 until the models and the index are loaded (see /ready)"""
+    if not request.app.state.models.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"The index is not loaded yet ({request.app.state.models.stage}).",
+            headers={"Retry-After": "10"}
+        )
+
+
+router = APIRouter(dependencies=[Depends(require_ready)])
+
+
+SummaryMode = Literal['base', 'rag', 'both']
 
 
 class BookSumSchema(BaseModel):
     book: str = Field(..., description="book title")
+    mode: SummaryMode = Field('both', description="base (LLM), rag (LLM+RAG) or both responses")
 
 
 class BookTextSumSchema(BaseModel):
     book_text: str = Field(..., description="book title")
+    mode: SummaryMode = Field('both', description="base (LLM), rag (LLM+RAG) or both responses")
+
 
+def run_model_given_book_title(model, content, mode) -> dict:
+    return model.summarize_given_book_title(content, mode)
 
-def run_model_given_book_title(model, content) -> dict:
-    return model.summarize_given_book_title(content)
 
+async def summarize_given_book_title(content: str, models: BookSumIndex, mode: str = 'both') -> dict:
+    if mode == 'both':
+        # both LLM calls are issued concurrently on the event loop
+        return await models.model.asummarize_given_book_title(content, mode)
 
-async def summarize_given_book_title(content: str, models: BookSumIndex) -> dict:
     response = await run_in_threadpool(
         run_model_given_book_title,
         models.model,
-        content
+        content,
+        mode
     )
 
     return response
 
 
-def run_model_given_book_text(model, content) -> dict:
-    return model.summarize_given_text(content)
+def run_model_given_book_text(model, content, mode) -> dict:
+    return model.summarize_given_text(content, mode)
+
 
+async def summarize_given_book_text(content: str, models: BookSumIndex, mode: str = 'both') -> dict:
+    if mode == 'both':
+        # both LLM calls are issued concurrently on the event loop
+        return await models.model.asummarize_given_text(content, mode)
 
-async def summarize_given_book_text(content: str, models: BookSumIndex) -> dict:
     response = await run_in_threadpool(
         run_model_given_book_text,
         models.model,
-        content
+        content,
+        mode
     )
 
     return response
 
 
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_summary_events(tokens):
+    # a sync generator: `StreamingResponse` iterates it in the threadpool, where the blocking summarizer work runs
+    # loaded with the model (llama-index), not at import time
+    from booksum.summarizer.booksummarizer import RESPONSE_KEYS
+
+    # one event per token, named after the response it belongs to (base-response/simple-rag)
+    try:
+        for mode, token in tokens:
+            yield sse_event(RESPONSE_KEYS[mode], token)
+    except Exception:
+        yield sse_event("error", traceback.format_exc())
+
+    yield sse_event("done", None)
+
+
 @router.post(
     "/summarize",
     status_code=status.HTTP_200_OK,
@@ -55,7 +102,7 @@ async def summarize_given_book_text(content: str, models: BookSumIndex) -> dict:
 async def summarize(
         request: Request,
         body: BookSumSchema = Body(
-            ..., example={"book": "String"}
+            ..., example={"book": "String", "mode": "both"}
         )
 ):
     models = request.app.state.models
@@ -63,7 +110,8 @@ async def summarize(
     try:
         response = await summarize_given_book_title(
             content=body.book,
-            models=models
+            models=models,
+            mode=body.mode
         )
 
         return JSONResponse(response)
@@ -84,7 +132,7 @@ async def summarize(
 async def summarize(
         request: Request,
         body: BookTextSumSchema = Body(
-            ..., example={"book_text": "String"}
+            ..., example={"book_text": "String", "mode": "both"}
         )
 ):
     models = request.app.state.models
@@ -92,7 +140,8 @@ async def summarize(
     try:
         response = await summarize_given_book_text(
             content=body.book_text,
-            models=models
+            models=models,
+            mode=body.mode
         )
 
         return JSONResponse(response)
@@ -102,3 +151,56 @@ async def summarize(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=traceback.format_exc()
         ) from ex
+
+
+@router.get(
+    "/cache/stats",
+    status_code=status.HTTP_200_OK,
+    summary="Summary cache statistics.",
+    response_description="Returns the hit/miss counters of the summary cache."
+  )
+async def cache_stats(request: Request):
+    result_cache = request.app.state.models.model.result_cache
+    semantic_cache = request.app.state.models.model.semantic_cache
+    semantic_stats = {"enabled": True, **semantic_cache.stats()} if semantic_cache is not None else {"enabled": False}
+
+    if result_cache is None:
+        return JSONResponse({"enabled": False, "semantic": semantic_stats})
+
+    return JSONResponse({"enabled": True, **result_cache.stats(), "semantic": semantic_stats})
+
+
+@router.post(
+    "/summarize/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Summarize a book, streaming the summary as server-sent events.",
+    response_description="Streams the book summary tokens."
+  )
+async def summarize_stream(
+        request: Request,
+        body: BookSumSchema = Body(
+            ..., example={"book": "String", "mode": "rag"}
+        )
+):
+    models = request.app.state.models
+    tokens = models.model.stream_summarize_given_book_title(body.book, body.mode)
+
+    return StreamingResponse(stream_summary_events(tokens), media_type="text/event-stream")
+
+
+@router.post(
+    "/summarize_text/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Summarize a book text, streaming the summary as server-sent events.",
+    response_description="Streams the text summary tokens."
+  )
+async def summarize_text_stream(
+        request: Request,
+        body: BookTextSumSchema = Body(
+            ..., example={"book_text": "String", "mode": "rag"}
+        )
+):
+    models = request.app.state.models
+    tokens = models.model.stream_summarize_given_text(body.book_text, body.mode)
+
+    return StreamingResponse(stream_summary_events(tokens), media_type="text/event-stream")
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+
+ANN_TYPES = ('none', 'hnsw')
+
+
+class HnswAnnIndex:
+    """HNSW approximate nearest neighbour index over the rows of a `MmapVectorStore` (cosine similarity)
+
+    Requires the optional `hnswlib` package.
+    """
+
+    def __init__(self, dim: int, M: int = 16, ef_construction: int = 200, ef_search: int = 64):
+        """
+        Args:
+            dim (int): embedding dimension
+            M (int): graph out-degree (memory/recall trade-off)
+            ef_construction (int): candidate list size while building
+            ef_search (int): candidate list size while searching (latency/recall trade-off)
+        """
+        try:
+            import hnswlib
+        except ImportError as ex:
+            raise ImportError("The hnsw ANN index requires hnswlib (pip install hnswlib)") from ex
+
+        self.dim = dim
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._index = hnswlib.Index(space='cosine', dim=dim)
+
+    @property
+    def size(self) -> int:
+        return self._index.get_current_count()
+
+    def build(self, embeddings: np.ndarray, block_rows: int = 65536) -> None:
+        self._index.init_index(max_elements=max(1, len(embeddings)), M=self.M, ef_construction=self.ef_construction)
+        for start in range(0, len(embeddings), block_rows):
+            block = np.asarray(embeddings[start:start + block_rows], dtype=np.float32)
+            self._index.add_items(block, np.arange(start, start + len(block)))
+        self._index.set_ef(self.ef_search)
+
+    def save(self, file_path: str) -> None:
+        tmp_path = f"{file_path}.tmp"
+        self._index.save_index(tmp_path)
+        os.replace(tmp_path, file_path)
+
+    def load(self, file_path: str, max_elements: int) -> None:
+        self._index.load_index(file_path, max_elements=max_elements)
+        self._index.set_ef(self.ef_search)
+
+    def mark_deleted(self, row: int) -> None:
+        self._index.mark_deleted(row)
+
+    def search(self, query_embedding: np.ndarray, top_k: int) -> tuple:
+        """Returns the rows and cosine similarities of the (approximate) `top_k` neighbours"""
+        top_k = min(top_k, self.size)
+        if top_k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        self._index.set_ef(max(self.ef_search, top_k))
+        rows, distances = self._index.knn_query(query_embedding.reshape(1, -1), k=top_k)
+        return rows[0].astype(np.int64), 1.0 - distances[0]
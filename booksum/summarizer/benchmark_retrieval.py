@@ -0,0 +1,128 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from booksum.summarizer.indexer import MANIFEST_FILE
+from booksum.summarizer.vector_store import MmapVectorStore
+from booksum.utils.embeddings import get_embed_model
+from booksum.utils.io_ops import get_settings
+
+
+def latency_stats(latencies: list) -> dict:
+    """Percentiles and mean (milliseconds) of latencies in seconds, shared by the benchmarks"""
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'mean_ms': float(latencies_ms.mean()),
+        'n': int(len(latencies_ms)),
+    }
+
+
+def query_texts(index_path: str, n_queries: int, queries_file: str = None, seed: int = 65535) -> list:
+    """Query texts: the lines of `queries_file` (e.g. held-out passages), or titles of the indexed documents"""
+    if queries_file is not None:
+        with open(queries_file, 'r') as file:
+            texts = [line.strip() for line in file if line.strip()]
+    else:
+        with open(os.path.join(index_path, MANIFEST_FILE), 'r') as file:
+            texts = list(json.load(file)['documents'])
+
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(texts), size=min(n_queries, len(texts)), replace=False)
+    return [texts[row] for row in rows]
+
+
+def benchmark_retrieval(index_path: str, ann_cfg: dict, queries: list, embed_model, top_k: int = 10) -> dict:
+    """Recall@k of the ANN search against the exact scan, and the query latency of both
+
+    The query texts are embedded by `embed_model` (the one of the index) before the searches are timed. The
+    ANN index is built in a temporary directory, the index under `index_path` is only read.
+    """
+    query_embeddings = np.asarray([embed_model.get_query_embedding(query) for query in queries], dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as bench_path:
+        # the persisted store is linked, not copied: only the ANN file is written (to the temporary directory)
+        for name in ('embeddings', 'norms', 'ids'):
+            os.symlink(os.path.abspath(MmapVectorStore._paths(index_path)[name]),
+                       MmapVectorStore._paths(bench_path)[name])
+
+        exact_store = MmapVectorStore.from_persist_dir(bench_path)
+        ann_store = MmapVectorStore.from_persist_dir(bench_path, ann_cfg=ann_cfg)
+        results = _search_all(exact_store, ann_store, query_embeddings, top_k)
+
+    embeddings = exact_store._embeddings
+    return {
+        'index_path': index_path,
+        'n_vectors': int(len(embeddings)),
+        'dim': int(embeddings.shape[1]),
+        'dtype': str(embeddings.dtype),
+        'n_queries': int(len(queries)),
+        'top_k': top_k,
+        'ann_cfg': ann_cfg,
+        **results,
+    }
+
+
+def _search_all(exact_store: MmapVectorStore, ann_store: MmapVectorStore, queries: np.ndarray, top_k: int) -> dict:
+    recalls, exact_latencies, ann_latencies = [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        exact_ids, _ = exact_store.search(query, top_k, exact=True)
+        exact_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ann_ids, _ = ann_store.search(query, top_k)
+        ann_latencies.append(time.perf_counter() - start)
+
+        recalls.append(len(set(exact_ids) & set(ann_ids)) / max(1, len(exact_ids)))
+
+    return {
+        f'recall@{top_k}': float(np.mean(recalls)),
+        'exact': latency_stats(exact_latencies),
+        'ann': latency_stats(ann_latencies),
+    }
+
+
+if __name__ == "__main__":
+    sum_logger = logging.getLogger()
+    sum_logger.setLevel(logging.WARNING)
+    console_handler = logging.StreamHandler()
+    sum_logger.addHandler(console_handler)
+
+    parser = argparse.ArgumentParser(description="ANN vs exact retrieval benchmark on a persisted mmap index.")
+    parser.add_argument('--index-path', default='models/index_with_literacy')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--ef-search', type=int, default=None)
+    parser.add_argument('--queries-file', default=None, help="one query per line (default: indexed titles)")
+    parser.add_argument('--output', default='retrieval_benchmark.json')
+    args = parser.parse_args()
+
+    summarizer_cfg = get_settings('./')['booksum_summarizer']
+    # ANN parameters from the services config (hnsw even when disabled there)
+    bench_ann_cfg = dict(summarizer_cfg['vector_store']['ann'], type='hnsw')
+    if args.ef_search is not None:
+        bench_ann_cfg['ef_search'] = args.ef_search
+
+    if not MmapVectorStore.exists(args.index_path):
+        raise FileNotFoundError(f"No memory-mapped vector store in {args.index_path} (vector_store.type: mmap)")
+
+    results = benchmark_retrieval(
+        args.index_path,
+        bench_ann_cfg,
+        query_texts(args.index_path, args.queries, queries_file=args.queries_file),
+        get_embed_model(summarizer_cfg.get('embedding'), logger=sum_logger),
+        top_k=args.top_k
+    )
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    sum_logger.warning(json.dumps(results, indent=2))
+    sum_logger.warning(f"Saved to {os.path.abspath(args.output)}")
@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+import yaml
+from fastapi import FastAPI
+
+from booksum import service_route
+from booksum.summarizer.benchmark_retrieval import latency_stats
+from booksum.summarizer.booksummarizer import BookSummarizer
+from booksum.summarizer.indexer import IncrementalIndexer
+from booksum.summarizer.stub_llm import StubLLMServer
+from booksum.utils.hash import get_file_hash
+from booksum.utils.io_ops import get_settings, load_parquet, to_parquet
+from booksum.utils.service_models import BookSumIndex
+
+BOOKS_CFG = 'config/books_to_process.yaml'
+
+
+def _git_commit(root_path: str) -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=root_path, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_fixture(root_path: str, fixture_path: str, api_base: str, n_books: int = 3, n_chapters: int = 100,
+                  seed: int = 65535) -> list:
+    """Root directory (config and data) of a small knowledge base sampled from the processed Parquet files
+
+    The services config is copied with the LLM pointing to `api_base`, no rate limit and no result cache, semantic
+    cache or summary store, so every request reaches the (stub) LLM.
+
+    Returns:
+        titles of the sampled gutenberg books
+    """
+    settings = get_settings(root_path)
+    cfg = settings['booksum_summarizer']
+    cfg['llm']['api_base'] = api_base
+    cfg['rate_limiter'].update(requests_per_minute=1e9, tokens_per_minute=1e12)
+    cfg['result_cache']['enabled'] = False
+    cfg['summary_store']['enabled'] = False
+    cfg['semantic_cache']['enabled'] = False
+
+    os.makedirs(os.path.join(fixture_path, 'config'), exist_ok=True)
+    with open(os.path.join(fixture_path, 'config/config_services.yaml'), 'w') as file:
+        yaml.safe_dump(settings, file, sort_keys=False)
+    shutil.copyfile(os.path.join(root_path, BOOKS_CFG), os.path.join(fixture_path, BOOKS_CFG))
+
+    # the clean books file is named after the books config, kept as is
+    with open(os.path.join(root_path, BOOKS_CFG), 'r') as file:
+        books_hash = get_file_hash(str(yaml.safe_load(file)))
+
+    data_path = os.path.join(root_path, 'data/processed')
+    fixture_data_path = os.path.join(fixture_path, 'data/processed')
+    os.makedirs(fixture_data_path, exist_ok=True)
+
+    books = load_parquet(os.path.join(data_path, f"{books_hash}_clean.parquet"), columns=['book-clean', 'title'])
+    books = books.sample(n=min(n_books, len(books)), random_state=seed)
+    to_parquet(books, os.path.join(fixture_data_path, f"{books_hash}_clean.parquet"))
+
+    chapters = load_parquet(os.path.join(data_path, "booksum.parquet"), columns=['chapter', 'book_id'])
+    chapters = chapters.sample(n=min(n_chapters, len(chapters)), random_state=seed)
+    to_parquet(chapters, os.path.join(fixture_data_path, "booksum.parquet"))
+
+    return books['title'].tolist()
+
+
+def _load_summarizer(fixture_path: str, logger) -> BookSummarizer:
+    # no literacy articles: they are fetched from the web
+    return BookSummarizer(logger, root_path=fixture_path, books_cfg_kb_filepath=BOOKS_CFG, frac=1,
+                          with_literacy=False)
+
+
+def _timed(fn, repeats: int) -> tuple:
+    latencies, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies, result
+
+
+async def _load_test(app: FastAPI, titles: list, concurrency: int, n_requests: int, mode: str) -> dict:
+    """Latency and throughput of `n_requests` /summarize requests, `concurrency` at a time"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+
+        async def request(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post('/summarize', json={'book': titles[i % len(titles)], 'mode': mode})
+                if response.status_code != 200:
+                    # failed requests would be counted as fast ones, the benchmark is not valid
+                    raise RuntimeError(f"/summarize failed at concurrency {concurrency} "
+                                       f"({response.status_code}): {response.text}")
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[request(i) for i in range(n_requests)])
+        elapsed = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'requests': n_requests,
+        'throughput_rps': n_requests / elapsed,
+        'latency': latency_stats(latencies),
+    }
+
+
+async def _load_tests(app: FastAPI, titles: list, concurrency_levels: tuple, n_requests: int, mode: str) -> list:
+    # a single event loop for all the levels: the async LLM client of the summarizer is bound to the first one
+    return [await _load_test(app, titles, concurrency, n_requests, mode) for concurrency in concurrency_levels]
+
+
+def benchmark_service(fixture_path: str, titles: list, logger, concurrency_levels: tuple = (1, 4, 16),
+                      requests_per_level: int = 32, repeats: int = 3, mode: str = 'both') -> dict:
+    """Startup, index load, retrieval and /summarize benchmarks on a fixture built by `build_fixture`"""
+    results = {}
+
+    index_path = os.path.join(fixture_path, 'models/index')
+    if not os.path.exists(index_path):
+        latencies, _ = _timed(lambda: _load_summarizer(fixture_path, logger), 1)
+        results['index_build_s'] = latencies[0]
+
+    # startup of the summarizer (llm, embedding model, persisted index and query engines)
+    latencies, model = _timed(lambda: _load_summarizer(fixture_path, logger), repeats)
+    results['startup'] = latency_stats(latencies)
+
+    indexer = IncrementalIndexer(index_path, logger=logger, vector_store_cfg=model.cfg.get('vector_store'))
+    latencies, _ = _timed(indexer.load, repeats)
+    results['index_load'] = latency_stats(latencies)
+
+    # query embedding and vector search
+    retriever = model.books_engine.retriever
+    latencies = []
+    for title in titles * repeats:
+        start = time.perf_counter()
+        retriever.retrieve(title)
+        latencies.append(time.perf_counter() - start)
+    results['retrieval'] = latency_stats(latencies)
+
+    # the service routes, served in process
+    app = FastAPI()
+    app.include_router(service_route.router)
+    app.state.models = BookSumIndex(fixture_path, logger=logger)
+    app.state.models.model = model
+
+    results['summarize'] = asyncio.run(_load_tests(app, titles, concurrency_levels, requests_per_level, mode))
+    return results
+
+
+if __name__ == "__main__":
+    sum_logger = logging.getLogger()
+    sum_logger.setLevel(logging.WARNING)
+    console_handler = logging.StreamHandler()
+    sum_logger.addHandler(console_handler)
+
+    parser = argparse.ArgumentParser(description="Offline service benchmark against a local stub LLM.")
+    parser.add_argument('--root-path', default='./')
+    parser.add_argument('--fixture-path', default=None, help="reused when it exists (temporary directory when unset)")
+    parser.add_argument('--books', type=int, default=3)
+    parser.add_argument('--chapters', type=int, default=100)
+    parser.add_argument('--llm-latency', type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument('--llm-tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--llm-completion-tokens', type=int, default=128)
+    parser.add_argument('--llm-port', type=int, default=8765)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=32, help="/summarize requests per concurrency level")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--mode', choices=['base', 'rag', 'both'], default='both')
+    parser.add_argument('--output', default='service_benchmark.json')
+    args = parser.parse_args()
+
+    # the stub does not check it
+    os.environ.setdefault('GROQ_API_KEY', 'stub')
+
+    stub_cfg = {
+        'latency': args.llm_latency,
+        'tokens_per_second': args.llm_tokens_per_second,
+        'completion_tokens': args.llm_completion_tokens,
+    }
+    bench_fixture_path = args.fixture_path or tempfile.mkdtemp(prefix='booksum-benchmark-')
+
+    with StubLLMServer(port=args.llm_port, **stub_cfg) as stub_llm:
+        bench_titles = build_fixture(args.root_path, bench_fixture_path, stub_llm.api_base, n_books=args.books,
+                                     n_chapters=args.chapters)
+        bench_results = benchmark_service(
+            bench_fixture_path,
+            bench_titles,
+            sum_logger,
+            concurrency_levels=tuple(args.concurrency),
+            requests_per_level=args.requests,
+            repeats=args.repeats,
+            mode=args.mode
+        )
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_commit': _git_commit(args.root_path),
+        'stub_llm': stub_cfg,
+        'fixture': {'path': bench_fixture_path, 'books': args.books, 'chapters': args.chapters, 'mode': args.mode},
+        'results': bench_results,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    sum_logger.warning(json.dumps(report, indent=2))
+    sum_logger.warning(f"Saved to {os.path.abspath(args.output)}")
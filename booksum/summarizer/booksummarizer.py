@@ -1,18 +1,31 @@
+import asyncio
 import logging
 import os
-import time
 
+import pandas as pd
+import pyarrow.dataset as ds
 import yaml
-from llama_index.core import Document, VectorStoreIndex, Settings, StorageContext, load_index_from_storage
+from llama_index.core import Document, Settings
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.response_synthesizers import TreeSummarize
-from llama_index.core.retrievers import VectorIndexRetriever
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.llms.groq import Groq
+from llama_index.core.schema import QueryBundle
 from llama_index.readers.web import SimpleWebPageReader
 
-from booksum.utils.hash import get_file_hash
-from booksum.utils.io_ops import load_parquet
+from booksum.summarizer.indexer import IncrementalIndexer, DERIVED_FILES
+from booksum.summarizer.map_reduce import MapReduceSummarizer
+from booksum.summarizer.rate_limited_llm import RateLimitedGroq
+from booksum.summarizer.retrieval import ContextPacker, InstrumentedVectorIndexRetriever
+from booksum.summarizer.summary_store import SummaryStore
+from booksum.utils.embeddings import get_embed_model
+from booksum.utils.hash import get_file_hash, get_dir_fingerprint
+from booksum.utils.instrumentation import timed, count_llm_calls, record_cache_lookup
+from booksum.utils.io_ops import iter_parquet_records, get_settings
+from booksum.utils.rate_limiter import get_rate_limiter
+from booksum.utils.result_cache import SummaryResultCache
+from booksum.utils.semantic_cache import SemanticQueryCache
+
+SUMMARY_MODES = ('base', 'rag', 'both')
+RESPONSE_KEYS = {'base': 'base-response', 'rag': 'simple-rag'}
 
 
 class BookSummarizer(object):
@@ -26,10 +39,17 @@ class BookSummarizer(object):
                  root_path,
                  books_cfg_kb_filepath,
                  frac: float = 1,
-                 with_literacy: bool = True):
+                 with_literacy: bool = True,
+                 cfg: dict = None,
+                 on_progress=None,
+                 read_only: bool = False):
         """
         Args:
             frac(float): loads a fraction of the knowledge base
+            cfg(dict): summarizer settings (`booksum_summarizer` section of the services config)
+            on_progress(callable): called with the name of each loading stage
+            read_only(bool): only load the persisted index, which must be up to date (it is shared by processes
+                serving it and built beforehand)
 
         Returns:
             BookSummarizer cls
@@ -38,6 +58,10 @@ class BookSummarizer(object):
         self.with_literacy = with_literacy
         self.logger = logger
 
+        if cfg is None:
+            cfg = get_settings(root_path)['booksum_summarizer']
+        self.cfg = cfg
+
         self.data_path = os.path.join(root_path, "data/processed")
         self.literacy_web_pages = {
             'sparknotes': 'https://www.sparknotes.com/writinghelp/how-to-write-literary-analysis/',
@@ -55,135 +79,467 @@ class BookSummarizer(object):
             index_model_path = index_model_path + "_with_literacy"
 
         # ------------------------------------------------------------------------------------
+        on_progress = on_progress or (lambda stage: None)
+
         logger.info("Setting LLM ...")
+        on_progress('llm')
         GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-        self.llm = Groq(model="llama-3.1-70b-versatile", api_key=GROQ_API_KEY, context_window=65536)
+        # another OpenAI compatible endpoint than Groq's (e.g. the stub LLM of the benchmarks)
+        llm_kwargs = {'api_base': cfg['llm']['api_base']} if cfg['llm'].get('api_base') else {}
+        self.llm = RateLimitedGroq(
+            model=cfg['llm']['model'],
+            api_key=GROQ_API_KEY,
+            context_window=cfg['llm']['context_window'],
+            limiter=get_rate_limiter(cfg['rate_limiter'], logger=logger),
+            **llm_kwargs
+        )
         self.summarizer = TreeSummarize(llm=self.llm, verbose=True)
+        # streams the tokens of the final reduction
+        self.streaming_summarizer = TreeSummarize(llm=self.llm, streaming=True, verbose=True)
 
         # todo: replace this to SOTA sentence embedding
-        Settings.embed_model = HuggingFaceEmbedding(
-            model_name="all-MiniLM-L6-v2",
-            device="cuda"
-        )
-
-        if not os.path.exists(index_model_path):
-            # ------------------------------------------------------------------------------------
-            self.logger.warning("Loading book repository...")
-            with open(os.path.join(root_path, books_cfg_kb_filepath), 'r') as file:
-                self.books_cfg_kb = yaml.safe_load(file)
-
-            books_hash = get_file_hash(str(self.books_cfg_kb))
-            books = load_parquet(
-                os.path.join(self.data_path, f"{books_hash}_clean.parquet")
-            )
-
-            books_from_booksum = load_parquet(
-                os.path.join(self.data_path, "booksum.parquet")
-            )
-            # ------------------------------------------------------------------------------------
-            self.logger.warning("Converting books (gutenberg) to LLamaIndex Document format...")
-            documents = []
-
-            if frac != 1:
-                self.logger.warning("Setting a fraction of the entire dataset...")
-                books = books.sample(frac=frac, random_state=65535)
-                # books_from_booksum = books_from_booksum.sample(frac=frac, random_state=65535)
-                books_from_booksum = books_from_booksum[books_from_booksum['book_id'].str.contains('The Last of the Mohicans')]
-
-            for index, record in books.iterrows():
-                text = record['book-clean']
-                title = record['title']
-                documents.append(Document(text=text, doc_id=title))
-
-            self.logger.warning("Converting books (booksum) to LLamaIndex Document format...")
-            for index, record in books_from_booksum.iterrows():
-                text = record['chapter']
-                book_id = record['book_id']
-                documents.append(Document(text=text, doc_id=book_id))
-
-            if with_literacy:
-                self.logger.warning("Integrating literacy articles...")
-
-                documents += SimpleWebPageReader(html_to_text=True).load_data(
-                    list(self.literacy_web_pages.values())
-                )
-                self.logger.warning("Done.")
-
-            self.logger.warning("Starting indexation ...")
-            # indexation
-            books_index = VectorStoreIndex.from_documents(documents, show_progress=False)
-            books_index.storage_context.persist(persist_dir=index_model_path)
-            self.logger.warning("Indexation completed...")
-
-        else:
+        # used both to build the index and to embed the queries
+        on_progress('embedding model')
+        Settings.embed_model = get_embed_model(cfg.get('embedding'), logger=logger)
+
+        self.logger.warning("Loading book repository...")
+        on_progress('index')
+        with open(os.path.join(root_path, books_cfg_kb_filepath), 'r') as file:
+            self.books_cfg_kb = yaml.safe_load(file)
+        books_hash = get_file_hash(str(self.books_cfg_kb))
+
+        # the index is only updated when the documents it was built from changed
+        indexer = IncrementalIndexer(index_model_path, logger=self.logger, vector_store_cfg=cfg.get('vector_store'))
+        index_source = get_file_hash(f"{books_hash}|frac={frac}|with_literacy={with_literacy}")
+
+        if read_only:
+            if not indexer.is_up_to_date(index_source):
+                raise RuntimeError(f"{index_model_path} is not up to date, it must be built before being shared")
+            self.logger.warning(f"Loading index {index_model_path} (read-only)...")
+            books_index = indexer.load(read_only=True)
+            self.logger.warning("Loaded.")
+        elif indexer.is_up_to_date(index_source):
             self.logger.warning(f"Loading previous index {index_model_path}...")
-            # rebuild storage context
-            storage_context = StorageContext.from_defaults(persist_dir=index_model_path)
-            # load index
-            books_index = load_index_from_storage(storage_context)
+            books_index = indexer.load()
+            indexer.ensure_snapshot(books_index)
             self.logger.warning("Loaded.")
+        else:
+            self.logger.warning("Starting indexation ...")
+            books_index = indexer.update(self._load_documents(books_hash, frac), index_source)
+            self.logger.warning("Indexation completed...")
 
         # init query engine
-        retriever = VectorIndexRetriever(
+        on_progress('query engines')
+        self.books_index = books_index
+        self.retrieval_cfg = cfg.get('retrieval', {})
+
+        # retrieved chunks are reranked, deduplicated and packed into a token budget before being summarized
+        self.node_postprocessors = []
+        packing_cfg = cfg.get('context_packing', {})
+        if packing_cfg.get('enabled', False):
+            self.node_postprocessors.append(ContextPacker(
+                vector_store=books_index.vector_store,
+                mmr_lambda=packing_cfg['mmr_lambda'],
+                duplicate_threshold=packing_cfg['duplicate_threshold'],
+                max_context_tokens=packing_cfg['max_context_tokens']
+            ))
+
+        retriever = InstrumentedVectorIndexRetriever(
             index=books_index,
-            similarity_top_k=10,
+            similarity_top_k=self.retrieval_cfg.get('similarity_top_k', 10),
             verbose=True
         )
 
         self.books_engine = RetrieverQueryEngine(
             retriever=retriever,
             response_synthesizer=self.summarizer,
+            node_postprocessors=self.node_postprocessors
         )
+        self.books_streaming_engine = RetrieverQueryEngine(
+            retriever=retriever,
+            response_synthesizer=self.streaming_summarizer,
+            node_postprocessors=self.node_postprocessors
+        )
+
+        # book title -> document ids, to restrict the retrieval of title summaries to that book
+        self.title_index = None
+        if self.retrieval_cfg.get('title_scoped', False):
+            self.title_index = indexer.title_index(self.retrieval_cfg.get('title_match_cutoff', 0.85))
 
-    def summarize_given_book_title(self, book_title: str) -> dict:
+        # ------------------------------------------------------------------------------------
+        # summaries are cached per index build: rebuilding the index changes its fingerprint
+        on_progress('caches')
+        self.index_fingerprint = get_dir_fingerprint(index_model_path, exclude=DERIVED_FILES)
+        self.result_cache = None
+        cache_cfg = cfg.get('result_cache', {})
+        if cache_cfg.get('enabled', False):
+            self.result_cache = SummaryResultCache(
+                path=os.path.join(root_path, cache_cfg['path']),
+                memory_entries=cache_cfg['memory_entries'],
+                disk_entries=cache_cfg['disk_entries'],
+                ttl_seconds=cache_cfg.get('ttl_seconds'),
+                logger=logger
+            )
+
+        # responses served to paraphrases of previous queries, the ones of a rebuilt index are never served
+        self.semantic_cache = None
+        self.semantic_cache_cfg = cfg.get('semantic_cache', {})
+        if self.semantic_cache_cfg.get('enabled', False):
+            self.semantic_cache = SemanticQueryCache(
+                path=os.path.join(root_path, self.semantic_cache_cfg['path']),
+                embed=Settings.embed_model.get_query_embedding,
+                threshold=self.semantic_cache_cfg['threshold'],
+                max_entries=self.semantic_cache_cfg['max_entries'],
+                logger=logger
+            )
+            self.semantic_cache.mark_stale(self.index_fingerprint)
+
+        # precomputed catalog summaries (see precompute_summaries.py)
+        self.summary_store = None
+        summary_store_cfg = cfg.get('summary_store', {})
+        if summary_store_cfg.get('enabled', False):
+            self.summary_store = SummaryStore(os.path.join(root_path, summary_store_cfg['path']),
+                                              index_version=self.index_fingerprint)
+
+        # long texts are condensed chunk by chunk before being summarized
+        self.map_reducer = None
+        map_reduce_cfg = cfg.get('map_reduce', {})
+        if map_reduce_cfg.get('enabled', False):
+            self.map_reducer = MapReduceSummarizer(
+                self.llm,
+                chunk_tokens=map_reduce_cfg['chunk_tokens'],
+                threshold_tokens=map_reduce_cfg['threshold_tokens'],
+                max_concurrency=map_reduce_cfg['max_concurrency'],
+                result_cache=self.result_cache,
+                logger=logger
+            )
+
+    def _load_documents(self, books_hash: str, frac: float):
+        """Yields the knowledge base (gutenberg books, booksum chapters and literacy articles) as Documents
+
+        Parquet files are streamed by record batches of the projected columns, so documents reach the indexer
+        as they are read and the corpus is never held in memory.
+        """
+        batch_size = self.cfg.get('indexing', {}).get('batch_size', 64)
+        books_path = os.path.join(self.data_path, f"{books_hash}_clean.parquet")
+        booksum_path = os.path.join(self.data_path, "booksum.parquet")
+
+        rows, booksum_filter = None, None
+        if frac != 1:
+            self.logger.warning("Setting a fraction of the entire dataset...")
+            # same books as `DataFrame.sample(frac=frac, random_state=65535)`, in file order
+            n_books = ds.dataset(books_path, format='parquet').count_rows()
+            rows = pd.RangeIndex(n_books).to_series().sample(frac=frac, random_state=65535).tolist()
+            booksum_filter = ('book_id', 'The Last of the Mohicans')
+
+        # ------------------------------------------------------------------------------------
+        self.logger.warning("Converting books (gutenberg) to LLamaIndex Document format...")
+        for record in iter_parquet_records(books_path, ['book-clean', 'title'], batch_size=batch_size, rows=rows):
+            yield Document(text=record['book-clean'], doc_id=record['title'])
+
+        self.logger.warning("Converting books (booksum) to LLamaIndex Document format...")
+        for record in iter_parquet_records(booksum_path, ['chapter', 'book_id'], batch_size=batch_size,
+                                           contains=booksum_filter):
+            yield Document(text=record['chapter'], doc_id=record['book_id'])
+
+        if self.with_literacy:
+            self.logger.warning("Integrating literacy articles...")
+
+            yield from SimpleWebPageReader(html_to_text=True).load_data(
+                list(self.literacy_web_pages.values())
+            )
+            self.logger.warning("Done.")
+
+    def summarize_given_book_title(self, book_title: str, mode: str = 'both') -> dict:
         """Summarizes an entire book
 
         Args:
             book_title (str): book title
+            mode (str): which responses to produce, one of `SUMMARY_MODES`
 
         Returns:
-            (base-response)
+            (base-response, simple-rag)
                 base-response: the baseline response
+                simple-rag: the retrieval augmented response
+        """
+        stored = self._stored_summary(book_title, mode)
+        if stored is not None:
+            return stored
+
+        return self._summarize(self._book_title_prompt(book_title), mode, self._book_doc_ids(book_title),
+                               query=('title', book_title))
+
+    async def asummarize_given_book_title(self, book_title: str, mode: str = 'both', use_cache: bool = True) -> dict:
+        """Async counterpart of `summarize_given_book_title`; with `mode='both'` both responses run concurrently
+
+        Args:
+            use_cache (bool): serve and cache the summary (False to summarize it afresh, e.g. when precomputing
+                the summary store, without reading nor writing the summary store and result/semantic caches)
         """
-        prompt = (f"You are a summarizer specialist and domain expert. Given the book {book_title} "
-                  f"provide me a clear summary without any prefix such as 'Here's the summary' or related.")
+        if use_cache:
+            # the summary store and title index lookups are blocking
+            stored = await asyncio.to_thread(self._stored_summary, book_title, mode)
+            if stored is not None:
+                return stored
 
-        return self._summarize(prompt)
+        doc_ids = await asyncio.to_thread(self._book_doc_ids, book_title)
+        return await self._asummarize(self._book_title_prompt(book_title), mode, doc_ids, query=('title', book_title),
+                                      use_cache=use_cache)
 
-    def summarize_given_text(self, text: str) -> dict:
+    def summarize_given_text(self, text: str, mode: str = 'both') -> dict:
         """Summarizes a given string
 
         Args:
             text (str): text
+            mode (str): which responses to produce, one of `SUMMARY_MODES`
 
         Returns:
-            (base-response)
+            (base-response, simple-rag)
                 base-response: the baseline response
+                simple-rag: the retrieval augmented response
         """
-        prompt = (f"You are a summarizer specialist and domain expert. Summarize the following text {text}. "
-                  f"Provide me a clear summary without any prefix such as 'Here's the summary' or related.")
+        query = ('text', text)
+        if self.map_reducer is not None:
+            text = self.map_reducer.condense(text)
 
-        return self._summarize(prompt)
+        return self._summarize(self._text_prompt(text), mode, query=query)
 
-    def _summarize(self, prompt):
-        self.logger.debug(f"performing search to prompt: {prompt}")
+    async def asummarize_given_text(self, text: str, mode: str = 'both') -> dict:
+        """Async counterpart of `summarize_given_text`; with `mode='both'` both responses run concurrently"""
+        query = ('text', text)
+        if self.map_reducer is not None:
+            text = await self.map_reducer.acondense(text)
 
-        base_response = str(self.summarizer.get_response("Summarize this text", [prompt]))
+        return await self._asummarize(self._text_prompt(text), mode, query=query)
 
-        # third-party cooldown
-        time.sleep(60)
-        rag_response = str(self.books_engine.query(prompt))
+    def stream_summarize_given_book_title(self, book_title: str, mode: str = 'both'):
+        """Streaming counterpart of `summarize_given_book_title`
 
-        result = {
-            'with-literacy-know-how': self.with_literacy,
-            'base-response': base_response,
-            'simple-rag': rag_response
-        }
+        Nothing runs before the generator is consumed, so the blocking lookups happen where it is iterated (the
+        threadpool of a streaming response), not where it is created.
+
+        Yields:
+            (mode, token) pairs, all the tokens of a mode being yielded before the next mode starts
+        """
+        stored = self._stored_summary(book_title, mode)
+        if stored is not None:
+            for run_mode in self._modes_to_run(mode):
+                yield run_mode, stored[RESPONSE_KEYS[run_mode]]
+            return
+
+        yield from self._stream_summarize(self._book_title_prompt(book_title), mode, self._book_doc_ids(book_title),
+                                          query=('title', book_title))
+
+    def stream_summarize_given_text(self, text: str, mode: str = 'both'):
+        """Streaming counterpart of `summarize_given_text`
+
+        Like `stream_summarize_given_book_title`, nothing runs before the generator is consumed: long texts are
+        condensed (blocking `condense`) where it is iterated, never on an event loop.
+
+        Yields:
+            (mode, token) pairs, all the tokens of a mode being yielded before the next mode starts
+        """
+        query = ('text', text)
+        if self.map_reducer is not None:
+            text = self.map_reducer.condense(text)
+
+        yield from self._stream_summarize(self._text_prompt(text), mode, query=query)
+
+    def _stored_summary(self, book_title: str, mode: str) -> dict | None:
+        """Precomputed summary of a catalog book for the loaded index, if any"""
+        if self.summary_store is None:
+            return None
+
+        entry = self.summary_store.get(book_title, self.index_fingerprint)
+        record_cache_lookup('summary_store', entry is not None)
+        if entry is None:
+            return None
+
+        return self._result({run_mode: entry[RESPONSE_KEYS[run_mode]] for run_mode in self._modes_to_run(mode)})
+
+    def _book_doc_ids(self, book_title: str) -> list | None:
+        """Documents the retrieval of a book title summary is restricted to (None to search the whole index)"""
+        if self.title_index is None:
+            return None
+
+        doc_ids = self.title_index.resolve(book_title)
+        if doc_ids is None:
+            self.logger.warning(f"Title {book_title} not found in the index, searching the whole index...")
+        return doc_ids
+
+    def _rag_engine(self, doc_ids: list | None = None, streaming: bool = False) -> RetrieverQueryEngine:
+        if doc_ids is None:
+            return self.books_streaming_engine if streaming else self.books_engine
+
+        retriever = InstrumentedVectorIndexRetriever(
+            index=self.books_index,
+            similarity_top_k=self.retrieval_cfg.get('similarity_top_k', 10),
+            doc_ids=doc_ids,
+            verbose=True
+        )
+        return RetrieverQueryEngine(
+            retriever=retriever,
+            response_synthesizer=self.streaming_summarizer if streaming else self.summarizer,
+            node_postprocessors=self.node_postprocessors
+        )
+
+    async def _arag_query(self, prompt, doc_ids=None):
+        """`aquery` of the RAG engine whose retrieval (query embedding, vector search and context packing, all
+        blocking) runs in a thread, only the synthesis LLM calls running on the event loop"""
+        engine = self._rag_engine(doc_ids)
+        query_bundle = QueryBundle(prompt)
+        nodes = await asyncio.to_thread(engine.retrieve, query_bundle)
+
+        return await engine.asynthesize(query_bundle, nodes)
+
+    @staticmethod
+    def _book_title_prompt(book_title: str) -> str:
+        return (f"You are a summarizer specialist and domain expert. Given the book {book_title} "
+                f"provide me a clear summary without any prefix such as 'Here's the summary' or related.")
+
+    @staticmethod
+    def _text_prompt(text: str) -> str:
+        return (f"You are a summarizer specialist and domain expert. Summarize the following text {text}. "
+                f"Provide me a clear summary without any prefix such as 'Here's the summary' or related.")
+
+    @staticmethod
+    def _modes_to_run(mode: str) -> list:
+        if mode not in SUMMARY_MODES:
+            raise ValueError(f"{mode} is not part of {SUMMARY_MODES}")
+
+        return ['base', 'rag'] if mode == 'both' else [mode]
+
+    def _result(self, responses: dict) -> dict:
+        result = {'with-literacy-know-how': self.with_literacy}
+        for mode, response in responses.items():
+            result[RESPONSE_KEYS[mode]] = str(response)
         print(result)
 
         return result
 
+    def _cache_key(self, prompt, mode):
+        return SummaryResultCache.make_key(prompt, mode, self.llm.model, self.index_fingerprint)
+
+    def _semantic_scope(self, query, mode, doc_ids=None) -> str | None:
+        """Scope of the cached queries a query can be matched with (None when it is not cached semantically)"""
+        kind, _ = query or (None, None)
+        if self.semantic_cache is None or kind not in self.semantic_cache_cfg.get('kinds', ['title']):
+            return None
+
+        # titles resolved to documents of the index only match the titles resolved to the same documents; the scope of
+        # unresolved ones (paraphrases such as "summarize pride and prejudice by austen") is the prefix of the scopes of
+        # every book, they are matched with the nearest cached title above the threshold (see `_cached_responses`)
+        books = get_file_hash(str(sorted(doc_ids))) if doc_ids is not None else ""
+        return "\x1f".join([kind, mode, self.llm.model, books])
+
+    def _cached_responses(self, prompt, modes, query=None, doc_ids=None) -> dict:
+        responses = {}
+        for run_mode in modes:
+            if self.result_cache is not None:
+                response = self.result_cache.get(self._cache_key(prompt, run_mode))
+                record_cache_lookup('result', response is not None)
+                if response is not None:
+                    responses[run_mode] = response
+                    continue
+
+            scope = self._semantic_scope(query, run_mode, doc_ids)
+            if scope is not None:
+                response = self.semantic_cache.get(query[1], scope, self.index_fingerprint,
+                                                   match_prefix=doc_ids is None)
+                record_cache_lookup('semantic', response is not None)
+                if response is not None:
+                    responses[run_mode] = response
+
+        return responses
+
+    def _cache_responses(self, prompt, responses: dict, query=None, doc_ids=None) -> None:
+        for run_mode, response in responses.items():
+            if self.result_cache is not None:
+                self.result_cache.put(self._cache_key(prompt, run_mode), str(response))
+
+            scope = self._semantic_scope(query, run_mode, doc_ids)
+            if scope is not None:
+                self.semantic_cache.put(query[1], scope, self.index_fingerprint, str(response))
+
+    @timed('summarize')
+    def _summarize(self, prompt, mode='both', doc_ids=None, query=None):
+        self.logger.debug(f"performing search to prompt: {prompt}")
+
+        modes = self._modes_to_run(mode)
+        responses = self._cached_responses(prompt, modes, query, doc_ids)
+
+        computed = {}
+        for run_mode in modes:
+            if run_mode in responses:
+                continue
+            if run_mode == 'base':
+                with timed('base_response'), count_llm_calls(run_mode):
+                    computed[run_mode] = self.summarizer.get_response("Summarize this text", [prompt])
+            else:
+                with timed('rag_query'), count_llm_calls(run_mode):
+                    computed[run_mode] = self._rag_engine(doc_ids).query(prompt)
+
+        self._cache_responses(prompt, computed, query, doc_ids)
+        responses.update(computed)
+
+        return self._result({run_mode: responses[run_mode] for run_mode in modes})
+
+    async def _asummarize(self, prompt, mode='both', doc_ids=None, query=None, use_cache=True):
+        self.logger.debug(f"performing search to prompt: {prompt}")
+
+        modes = self._modes_to_run(mode)
+        responses = {}
+        if use_cache:
+            # cache lookups (SQLite, query embeddings) are blocking: they run in a thread, off the event loop
+            responses = await asyncio.to_thread(self._cached_responses, prompt, modes, query, doc_ids)
+
+        calls = {
+            'base': lambda: self.summarizer.aget_response("Summarize this text", [prompt]),
+            'rag': lambda: self._arag_query(prompt, doc_ids)
+        }
+        stages = {'base': 'base_response', 'rag': 'rag_query'}
+
+        async def run(run_mode):
+            with timed(stages[run_mode]), count_llm_calls(run_mode):
+                return await calls[run_mode]()
+
+        missing = [run_mode for run_mode in modes if run_mode not in responses]
+        with timed('summarize'):
+            computed = dict(zip(missing, await asyncio.gather(*[run(run_mode) for run_mode in missing])))
+
+        if use_cache:
+            await asyncio.to_thread(self._cache_responses, prompt, computed, query, doc_ids)
+        responses.update(computed)
+
+        return self._result({run_mode: responses[run_mode] for run_mode in modes})
+
+    def _stream_summarize(self, prompt, mode='both', doc_ids=None, query=None):
+        self.logger.debug(f"performing search to prompt: {prompt}")
+
+        modes = self._modes_to_run(mode)
+        cached = self._cached_responses(prompt, modes, query, doc_ids)
+
+        for run_mode in modes:
+            if run_mode in cached:
+                yield run_mode, cached[run_mode]
+                continue
+
+            if run_mode == 'base':
+                tokens = self.streaming_summarizer.get_response("Summarize this text", [prompt])
+            else:
+                tokens = self._rag_engine(doc_ids, streaming=True).query(prompt).response_gen
+
+            if isinstance(tokens, str):
+                tokens = [tokens]
+
+            response = []
+            for token in tokens:
+                response.append(token)
+                yield run_mode, token
+
+            self._cache_responses(prompt, {run_mode: "".join(response)}, query, doc_ids)
+
 
 if __name__ == "__main__":
     sum_logger = logging.getLogger()
@@ -1,10 +1,18 @@
+import argparse
+import asyncio
+import json
+import os
+
+import httpx
 import pandas as pd
 import random
-import evaluate
 import logging
 
+from booksum.summarizer.metrics import MetricsEngine, load_metric
 from booksum.utils.io_ops import BookSumDataSetIO, load_parquet
-from booksum.utils.service_utils import book_summary_api
+from booksum.utils.service_utils import book_summary_api, abook_summary_api
+
+RESULT_COLUMNS = ['ref', 'bid', 'summary', 'base-response', 'simple-rag', 'with-literacy-know-how']
 
 
 class Evaluation:
@@ -15,12 +23,14 @@ class Evaluation:
 
         # load BookSum utility
         self.book_sum = BookSumDataSetIO(
-            data_path=self.data_path
+            data_path=self.data_path,
+            lazy=True
         )
 
         self.metric_names = ["bleu", "rouge", "meteor"]
         # Load the evaluation metric
-        self.metrics = dict(zip(self.metric_names, map(lambda x: evaluate.load(x), self.metric_names)))
+        self.metrics = dict(zip(self.metric_names, map(load_metric, self.metric_names)))
+        self.metrics_engine = MetricsEngine(self.metric_names)
 
     def _calc_metrics(self, pred, resp) -> pd.DataFrame:
         results = pd.DataFrame(columns=[key for key in self.metric_names])
@@ -37,18 +47,12 @@ class Evaluation:
 
         with_literacy_know_how = results['with-literacy-know-how'].unique()[0]
 
-        metrics = pd.DataFrame(columns=[key for key in self.metric_names])
-        # Compute summarization metrics
-        for response_type in ['base-response', 'simple-rag']:
-            met = self._calc_metrics(results[response_type], results['summary'])
-            # set index for reference
-            met = met.set_index(pd.Series([response_type]))
-
-            metrics = pd.concat([metrics, met], axis=0)
+        # per-sample and aggregate scores of each response type
+        metrics = self.metrics_engine.score(results, response_types=('base-response', 'simple-rag'))
 
         self.logger.warning('Saving a metrics ...')
-        df = pd.DataFrame(metrics)
-        df.to_parquet(f'metrics_with-literacy-know-how={with_literacy_know_how}.parquet')
+        metrics.to_parquet(f'metrics_with-literacy-know-how={with_literacy_know_how}.parquet')
+        return metrics
 
     @staticmethod
     def summarize_given_text(text):
@@ -81,37 +85,107 @@ class Evaluation:
         results = self._calc_metrics([response], [summary])
         return results
 
-    def evaluate_random_batch(self):
-
-        batch_results = pd.DataFrame(
-            columns=['ref', 'summary', 'base-response', 'simple-rag', 'with-literacy-know-how']
-        )
-
-        # just to test in order to avoid rate limit errors
-        # books = self.book_sum.booksum[self.book_sum.booksum.chapter_length < 1000]
-        # bids = random.sample(books.bid.unique().tolist(), 10)
-        books = self.book_sum.booksum[self.book_sum.booksum['book_id'].str.contains('The Last of the Mohicans')]
-        books = books[books.is_aggregate == False]
-        bids = random.sample(books.index.unique().tolist(), 10)
+    def sample_refs(self, n_samples: int = 10, book_filter: str | None = 'The Last of the Mohicans') -> list:
+        """Row refs of `n_samples` random (non aggregated) BookSum chapters, the same ones on every run
 
-        for item, bid in enumerate(bids):
-            # summary, chapter, book_parquet_ref = \
-            #     self.book_sum.get_booksum_by_bid(bid)
-            summary, chapter, book_parquet_ref = \
-                self.book_sum.get_booksum_by_index(bid)
+        Args:
+            n_samples (int): sample size (capped to the available chapters)
+            book_filter (str): only chapters whose book_id contains it, None for the whole dataset
+        """
+        books = self.book_sum.booksum
+        if book_filter:
+            books = books[books['book_id'].str.contains(book_filter, regex=False)]
+        books = books[books.is_aggregate == False]  # noqa: E712
 
-            response = self.summarize_given_text(chapter)
+        refs = books.index.unique().tolist()
+        return random.Random(65535).sample(refs, min(n_samples, len(refs)))
 
-            batch_results.loc[item] = (
-                    [book_parquet_ref] +
-                    [summary] +
-                    [response['base-response']] + [response['simple-rag']] +
-                    [response['with-literacy-know-how']]
-            )
+    @staticmethod
+    def load_checkpoint(checkpoint_path: str) -> pd.DataFrame:
+        """Results already written to a JSONL checkpoint (truncated lines of a crashed run are ignored)"""
+        records = []
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'r') as file:
+                for line in file:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+
+        return pd.DataFrame(records, columns=RESULT_COLUMNS)
+
+    async def aevaluate_random_batch(self,
+                                     n_samples: int = 10,
+                                     book_filter: str | None = 'The Last of the Mohicans',
+                                     concurrency: int = 4,
+                                     timeout: float = 600.0,
+                                     checkpoint_path: str = 'metrics_snapshot.jsonl') -> pd.DataFrame:
+        """Summarizes a random sample of chapters through the service, `concurrency` requests at a time
+
+        Every result is appended to `checkpoint_path` as soon as it arrives; samples already in the checkpoint
+        are skipped, so an interrupted run resumes where it stopped. Failed samples are retried on the next run.
+
+        Returns:
+            every result of the checkpoint
+        """
+        refs = self.sample_refs(n_samples, book_filter)
+        done = set(self.load_checkpoint(checkpoint_path)['ref'])
+        pending = [ref for ref in refs if ref not in done]
+        self.logger.warning(f"{len(refs) - len(pending)} samples already scored, {len(pending)} to go...")
+
+        semaphore = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+        async with httpx.AsyncClient(timeout=httpx.Timeout(timeout), limits=limits) as client:
+            with open(checkpoint_path, 'a+') as checkpoint:
+                # terminate the truncated line of a crashed run
+                if checkpoint.tell() > 0:
+                    checkpoint.seek(checkpoint.tell() - 1)
+                    if checkpoint.read(1) != "\n":
+                        checkpoint.write("\n")
+
+                async def score(ref):
+                    summary, chapter, book_parquet_ref = self.book_sum.get_booksum_by_index(ref)
+                    async with semaphore:
+                        try:
+                            response = await abook_summary_api(client, {"book_text": chapter}, "book-passage")
+                        except httpx.HTTPError as ex:
+                            self.logger.warning(f"Failed to summarize sample {ref} ({ex!r}), retried on the next run.")
+                            return
+
+                    record = {
+                        'ref': book_parquet_ref,
+                        'bid': self.book_sum.booksum['bid'].iat[ref],
+                        'summary': summary,
+                        'base-response': response['base-response'],
+                        'simple-rag': response['simple-rag'],
+                        'with-literacy-know-how': response['with-literacy-know-how'],
+                    }
+                    # numpy scalars of the dataset as python ones
+                    checkpoint.write(json.dumps(record, default=lambda value: value.item()) + "\n")
+                    checkpoint.flush()
+
+                await asyncio.gather(*[score(ref) for ref in pending])
+
+        return self.load_checkpoint(checkpoint_path)
+
+    def evaluate_random_batch(self,
+                              n_samples: int = 10,
+                              book_filter: str | None = 'The Last of the Mohicans',
+                              concurrency: int = 4,
+                              timeout: float = 600.0,
+                              checkpoint_path: str = 'metrics_snapshot.jsonl'):
+
+        batch_results = asyncio.run(self.aevaluate_random_batch(
+            n_samples=n_samples,
+            book_filter=book_filter,
+            concurrency=concurrency,
+            timeout=timeout,
+            checkpoint_path=checkpoint_path
+        ))
 
         self.logger.warning('Saving a snapshot of results...')
-        df = pd.DataFrame(batch_results)
-        df.to_parquet('metrics_snapshot.parquet')
+        batch_results.to_parquet('metrics_snapshot.parquet')
 
         self._calc_metrics_batch(batch_results)
 
@@ -124,8 +198,23 @@ if __name__ == "__main__":
     console_handler = logging.StreamHandler()
     sum_logger.addHandler(console_handler)
 
-    eval_book_summary = Evaluation(logger=sum_logger, data_path='../../data/processed')
-    eval_book_summary.evaluate_random_batch()
+    parser = argparse.ArgumentParser(description="Evaluates the summarization service on BookSum chapters.")
+    parser.add_argument('--data-path', default='../../data/processed')
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--book-filter', default='The Last of the Mohicans',
+                        help="only chapters whose book_id contains it, '' for the whole dataset")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=600.0)
+    parser.add_argument('--checkpoint', default='metrics_snapshot.jsonl')
+    args = parser.parse_args()
+
+    eval_book_summary = Evaluation(logger=sum_logger, data_path=args.data_path)
+    eval_book_summary.evaluate_random_batch(
+        n_samples=args.samples,
+        book_filter=args.book_filter or None,
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+        checkpoint_path=args.checkpoint
+    )
     # ignore the below as it just a local test
     eval_book_summary._calc_metrics_batch('metrics_snapshot.parquet')  # noqa
-
@@ -0,0 +1,166 @@
+import json
+import os
+from typing import Iterable
+
+from llama_index.core import Document, VectorStoreIndex, StorageContext, load_index_from_storage
+from llama_index.core.vector_stores import SimpleVectorStore
+
+from booksum.summarizer.snapshot import SNAPSHOT_DIR, export_snapshot, load_snapshot, snapshot_is_current
+from booksum.summarizer.title_index import TitleIndex, TITLE_INDEX_FILE
+from booksum.summarizer.vector_store import MmapVectorStore, MMAP_VECTOR_STORE_ANN_FILE
+
+MANIFEST_FILE = "doc_hashes.json"
+# files (re)built from the index when it is loaded, they do not change what the index answers
+DERIVED_FILES = (SNAPSHOT_DIR, TITLE_INDEX_FILE, MMAP_VECTOR_STORE_ANN_FILE)
+VECTOR_STORE_TYPES = ('simple', 'mmap')
+
+
+class IncrementalIndexer:
+    """Keeps a persisted `VectorStoreIndex` in sync with its source documents
+
+    A manifest stored next to the index records the content hash of every indexed document, so an
+    update only embeds new or changed documents and deletes the removed ones instead of rebuilding
+    the whole index.
+    """
+
+    def __init__(self, index_path: str, logger, vector_store_cfg: dict = None):
+        """
+        Args:
+            index_path (str): persisted index directory
+            vector_store_cfg (dict): `type` (simple: llama-index JSON store, mmap: `MmapVectorStore`),
+                `dtype` of the mmap embeddings, its optional `ann` index settings and whether to keep a binary
+                `snapshot` of the nodes (mmap only) to load instead of the JSON docstore
+        """
+        self.index_path = index_path
+        self.logger = logger
+        self.manifest_path = os.path.join(index_path, MANIFEST_FILE)
+
+        vector_store_cfg = vector_store_cfg or {}
+        self.vector_store_type = vector_store_cfg.get('type', 'simple')
+        self.vector_store_dtype = vector_store_cfg.get('dtype', 'float16')
+        self.ann_cfg = vector_store_cfg.get('ann')
+        self.snapshot = vector_store_cfg.get('snapshot', False) and self.vector_store_type == 'mmap'
+        if self.vector_store_type not in VECTOR_STORE_TYPES:
+            raise ValueError(f"{self.vector_store_type} is not part of {VECTOR_STORE_TYPES}")
+
+    def _load_manifest(self) -> dict | None:
+        if not os.path.exists(self.manifest_path):
+            return None
+
+        with open(self.manifest_path, 'r') as file:
+            return json.load(file)
+
+    def _save_manifest(self, source: str, doc_hashes: dict) -> None:
+        with open(self.manifest_path, 'w') as file:
+            json.dump({'source': source, 'documents': doc_hashes}, file)
+
+    def is_up_to_date(self, source: str) -> bool:
+        """True when the persisted index was built from the documents identified by `source`"""
+        manifest = self._load_manifest()
+        return manifest is not None and manifest['source'] == source
+
+    def _vector_store(self, persisted: bool):
+        """Vector store of the index (None for llama-index default one)"""
+        if self.vector_store_type == 'simple':
+            return None
+
+        if persisted and MmapVectorStore.exists(self.index_path):
+            return MmapVectorStore.from_persist_dir(self.index_path, ann_cfg=self.ann_cfg)
+
+        if persisted:
+            # one-off conversion of an index persisted with the JSON vector store
+            self.logger.warning("Converting the JSON vector store to a memory-mapped one...")
+            vector_store = MmapVectorStore.from_simple_vector_store(
+                SimpleVectorStore.from_persist_dir(self.index_path), dtype=self.vector_store_dtype, ann_cfg=self.ann_cfg
+            )
+            vector_store.persist(os.path.join(self.index_path, "default__vector_store.json"))
+            return vector_store
+
+        return MmapVectorStore(dtype=self.vector_store_dtype, ann_cfg=self.ann_cfg)
+
+    def load(self, use_snapshot: bool = True, read_only: bool = False) -> VectorStoreIndex:
+        """
+        Args:
+            use_snapshot (bool): load the binary snapshot when enabled and current
+            read_only (bool): the index is only queried (snapshot nodes are not kept once built)
+        """
+        if use_snapshot and self.snapshot and snapshot_is_current(self.index_path):
+            self.logger.warning("Loading the index snapshot...")
+            return load_snapshot(self.index_path, self._vector_store(persisted=True), read_only=read_only)
+
+        if read_only and self.snapshot:
+            self.logger.warning("The index snapshot is stale: loading the JSON docstore instead.")
+
+        storage_context = StorageContext.from_defaults(
+            persist_dir=self.index_path, vector_store=self._vector_store(persisted=True)
+        )
+        return load_index_from_storage(storage_context)
+
+    def ensure_snapshot(self, index: VectorStoreIndex) -> None:
+        """Exports the snapshot of a loaded index when it is enabled but missing or stale"""
+        if self.snapshot and not snapshot_is_current(self.index_path):
+            self.logger.warning("Exporting the index snapshot...")
+            export_snapshot(index, self.index_path)
+
+    def update(self, documents: Iterable[Document], source: str) -> VectorStoreIndex:
+        """Inserts new/changed documents, deletes removed ones and persists the index
+
+        Args:
+            documents: all the documents the index should hold (consumed once, may be a generator)
+            source (str): fingerprint of the documents, checked by `is_up_to_date`
+
+        Returns:
+            the updated index
+        """
+        if os.path.exists(self.index_path):
+            index = self.load()
+            manifest = self._load_manifest()
+            if manifest is not None:
+                indexed = manifest['documents']
+            else:
+                # index persisted before manifests existed: recover the hashes from its docstore
+                indexed = {doc_id: doc_hash for doc_hash, doc_id in index.docstore.get_all_document_hashes().items()}
+        else:
+            storage_context = StorageContext.from_defaults(vector_store=self._vector_store(persisted=False))
+            index = VectorStoreIndex([], storage_context=storage_context)
+            indexed = {}
+
+        current = {}
+        inserted, skipped = 0, 0
+        for document in documents:
+            doc_id = document.doc_id
+            if doc_id in current:
+                # the first document of a given id wins
+                skipped += 1
+                continue
+            current[doc_id] = document.hash
+
+            if indexed.get(doc_id) == document.hash:
+                continue
+            if doc_id in indexed:
+                index.delete_ref_doc(doc_id, delete_from_docstore=True)
+            index.insert(document)
+            inserted += 1
+
+        removed = [doc_id for doc_id in indexed if doc_id not in current]
+        for doc_id in removed:
+            index.delete_ref_doc(doc_id, delete_from_docstore=True)
+
+        self.logger.warning(f"Index update: {inserted} documents (re)embedded, {len(removed)} removed, "
+                            f"{len(current) - inserted} unchanged, {skipped} duplicated ids skipped.")
+
+        index.storage_context.persist(persist_dir=self.index_path)
+        self._save_manifest(source, current)
+        if self.snapshot:
+            export_snapshot(index, self.index_path)
+        TitleIndex.from_doc_ids(current).save(self.index_path)
+        return index
+
+    def title_index(self, match_cutoff: float = 0.85) -> TitleIndex:
+        """Title lookup of the persisted index (built from the manifest for indexes persisted without one)"""
+        if os.path.exists(os.path.join(self.index_path, TITLE_INDEX_FILE)):
+            return TitleIndex.load(self.index_path, match_cutoff=match_cutoff)
+
+        title_index = TitleIndex.from_doc_ids(self._load_manifest()['documents'], match_cutoff=match_cutoff)
+        title_index.save(self.index_path)
+        return title_index
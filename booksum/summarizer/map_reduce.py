@@ -0,0 +1,216 @@
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+
+from llama_index.core import PromptTemplate
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.utils import get_tokenizer
+
+from booksum.utils.instrumentation import record_cache_lookup
+from booksum.utils.result_cache import SummaryResultCache
+
+CHUNK_SUMMARY_PROMPT = PromptTemplate(
+    "You are a summarizer specialist and domain expert. Summarize the following passage of a longer text, "
+    "keeping the events, characters and facts needed to summarize the whole text later. "
+    "Do not add any prefix such as 'Here's the summary' or related.\n"
+    "Passage:\n{passage}\n"
+)
+
+_PARAGRAPH_END = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def _pieces(text: str, separator: re.Pattern) -> list:
+    """Splits `text` after every `separator`, which is kept at the end of its piece"""
+    pieces, start = [], 0
+    for match in separator.finditer(text):
+        pieces.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        pieces.append(text[start:])
+
+    return pieces
+
+
+class MapReduceSummarizer:
+    """Hierarchical summarization of texts that do not fit a single prompt
+
+    The text is split into token-budgeted chunks which are summarized concurrently; the summaries are
+    then grouped and summarized again, level by level, until they fit in one chunk. Chunk summaries are
+    cached by content hash, so re-submitting an edited text only summarizes the chunks that changed.
+
+    Chunk boundaries are content-defined: paragraphs (sentences of the longer ones) are packed into a chunk
+    until one of them is an anchor, picked by its hash with a probability proportional to its tokens (a chunk
+    holds half of `chunk_tokens` on average), or the budget is reached. An edit only moves the boundaries up
+    to the next anchor, the later chunks keep their content and cache keys.
+    """
+
+    def __init__(self,
+                 llm,
+                 chunk_tokens: int = 8000,
+                 threshold_tokens: int = 16000,
+                 max_concurrency: int = 4,
+                 result_cache: SummaryResultCache = None,
+                 logger=None):
+        """
+        Args:
+            llm: llama-index LLM used to summarize the chunks
+            chunk_tokens (int): token budget of each chunk (and of the condensed text)
+            threshold_tokens (int): texts above this size are condensed
+            max_concurrency (int): maximum number of chunks being summarized at once
+            result_cache (SummaryResultCache): cache of chunk summaries (None to disable)
+        """
+        self.llm = llm
+        self.chunk_tokens = chunk_tokens
+        self.threshold_tokens = threshold_tokens
+        self.max_concurrency = max_concurrency
+        self.result_cache = result_cache
+        self.logger = logger
+
+        self._tokenizer = get_tokenizer()
+        # splits the sentences over the budget on their own
+        self._splitter = SentenceSplitter(chunk_size=chunk_tokens, chunk_overlap=0)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self._tokenizer(text))
+
+    def needs_condensing(self, text: str) -> bool:
+        return self.count_tokens(text) > self.threshold_tokens
+
+    def condense(self, text: str) -> str:
+        """Blocking counterpart of `acondense`
+
+        Chunks are summarized by a thread pool with the sync client: no event loop is created per call, so the
+        async client of the LLM stays bound to the loop of the service.
+        """
+        if not self.needs_condensing(text):
+            return text
+
+        chunks = self.split(text)
+        level = 0
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while True:
+                self._log_level(level, chunks)
+                summaries = list(executor.map(self._summarize_chunk_sync, chunks))
+
+                chunks = self._next_level(summaries)
+                if chunks is None:
+                    return "\n\n".join(summaries)
+                level += 1
+
+    async def acondense(self, text: str) -> str:
+        """Reduces `text` to concatenated summaries fitting in `chunk_tokens`; short texts are returned as is"""
+        # tokenizing and splitting a book is CPU bound, it runs off the event loop
+        if not await asyncio.to_thread(self.needs_condensing, text):
+            return text
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        chunks = await asyncio.to_thread(self.split, text)
+        level = 0
+
+        while True:
+            self._log_level(level, chunks)
+            summaries = await asyncio.gather(*[self._summarize_chunk(chunk, semaphore) for chunk in chunks])
+
+            chunks = await asyncio.to_thread(self._next_level, summaries)
+            if chunks is None:
+                return "\n\n".join(summaries)
+            level += 1
+
+    def _log_level(self, level: int, chunks: list) -> None:
+        if self.logger:
+            self.logger.warning(f"Map-reduce level {level}: summarizing {len(chunks)} chunks...")
+
+    def _next_level(self, summaries: list) -> list | None:
+        """Chunks of the next level (None once the summaries fit in one chunk)"""
+        if len(summaries) == 1 or self.count_tokens("\n\n".join(summaries)) <= self.chunk_tokens:
+            return None
+
+        return self._group(summaries)
+
+    def split(self, text: str) -> list:
+        """Content-defined chunks of `text` fitting in `chunk_tokens`"""
+        units = []
+        for paragraph in _pieces(text, _PARAGRAPH_END):
+            for sentence in ([paragraph] if self.count_tokens(paragraph) <= self.chunk_tokens
+                             else _pieces(paragraph, _SENTENCE_END)):
+                if self.count_tokens(sentence) <= self.chunk_tokens:
+                    units.append(sentence)
+                else:
+                    units += [f"{piece} " for piece in self._splitter.split_text(sentence)]
+
+        return [chunk for chunk in ("".join(group).strip() for group in self._pack(units)) if chunk]
+
+    def _is_anchor(self, unit: str, tokens: int) -> bool:
+        """Whether a chunk ends after `unit`, with a probability of `tokens` over half of `chunk_tokens`"""
+        digest = int.from_bytes(sha256(unit.strip().encode("utf-8", "surrogatepass")).digest()[:8], 'big')
+        return digest < tokens * 2 ** 65 / self.chunk_tokens
+
+    def _pack(self, units: list) -> list:
+        """Groups of consecutive units, closed after an anchor or before exceeding `chunk_tokens`"""
+        groups, group, group_tokens = [], [], 0
+        for unit in units:
+            tokens = self.count_tokens(unit)
+            if group and group_tokens + tokens > self.chunk_tokens:
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append(unit)
+            group_tokens += tokens
+            if self._is_anchor(unit, tokens):
+                groups.append(group)
+                group, group_tokens = [], 0
+
+        if group:
+            groups.append(group)
+        return groups
+
+    def _group(self, summaries: list) -> list:
+        """Packs consecutive summaries into groups fitting in `chunk_tokens`"""
+        groups = ["\n\n".join(group) for group in self._pack(summaries)]
+        # always make progress, even when every summary ends a group on its own
+        if len(groups) == len(summaries):
+            groups = ["\n\n".join(summaries[ix:ix + 2]) for ix in range(0, len(summaries), 2)]
+
+        return groups
+
+    def _cache_key(self, chunk: str) -> str | None:
+        if self.result_cache is None:
+            return None
+
+        return SummaryResultCache.make_key(chunk, 'chunk', self.llm.model, '')
+
+    def _cached_summary(self, key: str | None) -> str | None:
+        if key is None:
+            return None
+
+        summary = self.result_cache.get(key)
+        record_cache_lookup('chunk', summary is not None)
+        return summary
+
+    def _summarize_chunk_sync(self, chunk: str) -> str:
+        key = self._cache_key(chunk)
+        summary = self._cached_summary(key)
+        if summary is not None:
+            return summary
+
+        summary = self.llm.predict(CHUNK_SUMMARY_PROMPT, passage=chunk)
+        if key is not None:
+            self.result_cache.put(key, summary)
+
+        return summary
+
+    async def _summarize_chunk(self, chunk: str, semaphore: asyncio.Semaphore) -> str:
+        # the cache is blocking (SQLite), it is read and written off the event loop
+        key = self._cache_key(chunk)
+        summary = await asyncio.to_thread(self._cached_summary, key)
+        if summary is not None:
+            return summary
+
+        async with semaphore:
+            summary = await self.llm.apredict(CHUNK_SUMMARY_PROMPT, passage=chunk)
+
+        if key is not None:
+            await asyncio.to_thread(self.result_cache.put, key, summary)
+
+        return summary
@@ -0,0 +1,202 @@
+import math
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import evaluate
+import nltk
+import pandas as pd
+from nltk.translate.meteor_score import single_meteor_score
+from rouge_score.tokenizers import DefaultTokenizer
+
+METRIC_NAMES = ('bleu', 'rouge', 'meteor')
+RESPONSE_TYPES = ('base-response', 'simple-rag')
+METRICS_COLUMNS = ['ref', 'response_type', 'metric', 'scope', 'score']
+BLEU_MAX_ORDER = 4
+
+
+@lru_cache(maxsize=None)
+def load_metric(name: str) -> evaluate.EvaluationModule:
+    """`evaluate` metric, loaded once per process"""
+    return evaluate.load(name)
+
+
+class Tokenizer13a:
+    """Default tokenizer (13a, from sacrebleu) of the `evaluate` bleu implementation, so scores are unchanged"""
+
+    _rules = [
+        (re.compile(r'([\{-\~\[-\` -\&\(-\+\:-\@\/])'), r' \1 '),
+        # period and comma, unless preceded by a digit
+        (re.compile(r'([^0-9])([\.,])'), r'\1 \2 '),
+        # period and comma, unless followed by a digit
+        (re.compile(r'([\.,])([^0-9])'), r' \1 \2'),
+        # dash preceded by a digit
+        (re.compile(r'([0-9])(-)'), r'\1 \2 '),
+    ]
+
+    def __call__(self, line: str) -> tuple:
+        line = line.replace('<skipped>', '').replace('-\n', '').replace('\n', ' ')
+        if '&' in line:
+            line = line.replace('&quot;', '"').replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
+
+        line = f" {line} "
+        for rule, replacement in self._rules:
+            line = rule.sub(replacement, line)
+        return tuple(line.split())
+
+
+# the tokenizers of the metrics, memoized: every reference is scored against each response type and metric
+@lru_cache(maxsize=None)
+def _bleu_tokenizer():
+    return lru_cache(maxsize=1 << 14)(Tokenizer13a())
+
+
+@lru_cache(maxsize=None)
+def _rouge_tokenizer():
+    # default tokenizer of `rouge_score` (without stemming, as in `evaluate`)
+    return lru_cache(maxsize=1 << 14)(DefaultTokenizer(use_stemmer=False).tokenize)
+
+
+@lru_cache(maxsize=1 << 14)
+def _meteor_tokens(text: str) -> tuple:
+    return tuple(nltk.word_tokenize(text))
+
+
+def _ngrams(tokens: tuple) -> Counter:
+    return Counter(tuple(tokens[ix:ix + order])
+                   for order in range(1, BLEU_MAX_ORDER + 1) for ix in range(len(tokens) - order + 1))
+
+
+def _bleu_stats(prediction: str, reference: str, tokenizer) -> list:
+    """Clipped n-gram matches and candidates of each order, then the prediction and reference lengths"""
+    prediction_tokens, reference_tokens = tokenizer(prediction), tokenizer(reference)
+    overlap = _ngrams(prediction_tokens) & _ngrams(reference_tokens)
+
+    matches = [0] * BLEU_MAX_ORDER
+    for ngram, count in overlap.items():
+        matches[len(ngram) - 1] += count
+    candidates = [max(0, len(prediction_tokens) - order + 1) for order in range(1, BLEU_MAX_ORDER + 1)]
+
+    return matches + candidates + [len(prediction_tokens), len(reference_tokens)]
+
+
+def _bleu_score(stats: list) -> float:
+    """BLEU (uniform weights, no smoothing) of summed `_bleu_stats`, as computed by `evaluate`"""
+    matches, candidates = stats[:BLEU_MAX_ORDER], stats[BLEU_MAX_ORDER:2 * BLEU_MAX_ORDER]
+    prediction_length, reference_length = stats[-2:]
+
+    precisions = [match / candidate if candidate else 0.0 for match, candidate in zip(matches, candidates)]
+    # also covers empty predictions, whose brevity penalty is undefined
+    if min(precisions) == 0:
+        return 0.0
+
+    geo_mean = math.exp(sum(math.log(precision) for precision in precisions) / BLEU_MAX_ORDER)
+    ratio = prediction_length / reference_length if reference_length else math.inf
+    return geo_mean * (1.0 if ratio > 1.0 else math.exp(1 - 1 / ratio))
+
+
+def _bleu(prediction: str, reference: str, tokenizer) -> float:
+    return _bleu_score(_bleu_stats(prediction, reference, tokenizer))
+
+
+def corpus_bleu(predictions: list, references: list, tokenizer) -> float:
+    """Corpus BLEU: the n-gram statistics of every sample are summed before the score is computed"""
+    stats = [0] * (2 * BLEU_MAX_ORDER + 2)
+    for prediction, reference in zip(predictions, references):
+        stats = [total + value for total, value in zip(stats, _bleu_stats(prediction, reference, tokenizer))]
+
+    return _bleu_score(stats)
+
+
+def _score_chunk(samples: list, metric_names: tuple) -> list:
+    """Per-sample scores of (ref, response type, prediction, reference) samples as tidy records"""
+    if 'meteor' in metric_names:
+        # fetches the nltk data meteor depends on
+        load_metric('meteor')
+
+    records = []
+    for ref, response_type, prediction, reference in samples:
+        if 'bleu' in metric_names:
+            records.append((ref, response_type, 'bleu', _bleu(prediction, reference, _bleu_tokenizer())))
+        if 'meteor' in metric_names:
+            # what `evaluate` meteor averages over the samples (alpha=0.9, beta=3, gamma=0.5)
+            score = single_meteor_score(_meteor_tokens(reference), _meteor_tokens(prediction))
+            records.append((ref, response_type, 'meteor', score))
+
+    if 'rouge' in metric_names and samples:
+        # a single call for the chunk, rouge scores every sample on its own without the aggregator
+        rouge = load_metric('rouge').compute(
+            predictions=[sample[2] for sample in samples],
+            references=[sample[3] for sample in samples],
+            tokenizer=_rouge_tokenizer(),
+            use_aggregator=False
+        )
+        for rouge_type, scores in rouge.items():
+            for (ref, response_type, _, _), score in zip(samples, scores):
+                records.append((ref, response_type, rouge_type, score))
+
+    return records
+
+
+class MetricsEngine:
+    """Per-sample and aggregate summarization metrics of each response type
+
+    Samples are scored in chunks across a process pool (ROUGE and METEOR are CPU bound); metrics and
+    tokenizations are cached per worker.
+    """
+
+    def __init__(self, metric_names: tuple = METRIC_NAMES, n_jobs: int = None, chunk_size: int = 32):
+        """
+        Args:
+            metric_names (tuple): metrics among `METRIC_NAMES`
+            n_jobs (int): worker processes (all cpus when None, 1 to score in process)
+            chunk_size (int): samples per task
+        """
+        self.metric_names = tuple(metric_names)
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def _chunks(self, results: pd.DataFrame, response_types: tuple):
+        samples = [
+            (ref, response_type, prediction, reference)
+            for response_type in response_types
+            for ref, prediction, reference in zip(results['ref'], results[response_type].fillna(""), results['summary'])
+        ]
+        for start in range(0, len(samples), self.chunk_size):
+            yield samples[start:start + self.chunk_size]
+
+    def score(self, results: pd.DataFrame, response_types: tuple = RESPONSE_TYPES) -> pd.DataFrame:
+        """Tidy scores (`METRICS_COLUMNS`) of evaluation results (`ref`, `summary` and response columns)
+
+        `scope` is `sample` for the score of a single response and `aggregate` for the score of a response type:
+        corpus BLEU, and the mean of the per-sample scores for the other metrics.
+        """
+        chunks = list(self._chunks(results, response_types))
+        if self.n_jobs == 1 or len(chunks) <= 1:
+            scored = [_score_chunk(chunk, self.metric_names) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(min(self.n_jobs, len(chunks))) as executor:
+                scored = list(executor.map(_score_chunk, chunks, [self.metric_names] * len(chunks)))
+
+        samples = pd.DataFrame(
+            [record for records in scored for record in records],
+            columns=['ref', 'response_type', 'metric', 'score']
+        )
+        samples['scope'] = 'sample'
+
+        aggregates = samples.groupby(['response_type', 'metric'], as_index=False, sort=False)['score'].mean()
+        if 'bleu' in self.metric_names:
+            aggregates = aggregates[aggregates['metric'] != 'bleu']
+            bleu_aggregates = [
+                (response_type, 'bleu', corpus_bleu(
+                    results[response_type].fillna("").tolist(), results['summary'].tolist(), _bleu_tokenizer()
+                ))
+                for response_type in response_types
+            ]
+            aggregates = pd.concat([aggregates, pd.DataFrame(bleu_aggregates, columns=aggregates.columns)])
+        aggregates['scope'] = 'aggregate'
+        aggregates['ref'] = None
+
+        return pd.concat([samples, aggregates], ignore_index=True)[METRICS_COLUMNS]
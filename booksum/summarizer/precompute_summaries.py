@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import logging
+import os
+
+import yaml
+
+from booksum.summarizer.booksummarizer import BookSummarizer
+from booksum.summarizer.summary_store import SummaryStore
+from booksum.summarizer.title_index import title_of_doc_id
+from booksum.utils.io_ops import load_parquet, get_settings
+
+
+def catalog_titles(root_path: str, books_cfg_kb_filepath: str) -> list:
+    """Gutenberg titles of the books config followed by the (distinct) BookSum book titles"""
+    with open(os.path.join(root_path, books_cfg_kb_filepath), 'r') as file:
+        books_cfg_kb = yaml.safe_load(file)
+
+    titles = [book['title'] for author in books_cfg_kb['authors'] for book in author['list-of-books']]
+
+    book_ids = load_parquet(os.path.join(root_path, "data/processed/booksum.parquet"), columns=['book_id'])
+    titles += [title_of_doc_id(book_id) for book_id in book_ids['book_id'].unique()]
+
+    # keep the first occurrence of each title
+    return list(dict.fromkeys(titles))
+
+
+async def precompute_summaries(model: BookSummarizer,
+                               store: SummaryStore,
+                               titles: list,
+                               max_concurrency: int = 2,
+                               checkpoint_every: int = 10,
+                               logger=None) -> int:
+    """Summarizes (base and RAG) the titles missing from `store` for the loaded index
+
+    Results are written every `checkpoint_every` titles, so an interrupted run resumes where it stopped.
+
+    Returns:
+        number of summarized titles
+    """
+    logger = logger or logging.getLogger(__name__)
+    index_version = model.index_fingerprint
+    pending = [title for title in titles if not store.contains(title, index_version)]
+    logger.warning(f"{len(titles) - len(pending)} titles already summarized, {len(pending)} to go...")
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    checkpoint = {}
+    summarized = 0
+
+    async def summarize(title):
+        nonlocal summarized
+        async with semaphore:
+            try:
+                # summarized afresh: a cached (possibly paraphrase-matched) summary must not be stored as the book's
+                result = await model.asummarize_given_book_title(title, 'both', use_cache=False)
+            except Exception as ex:
+                logger.warning(f"Failed to summarize {title} ({ex}), it will be retried on the next run.")
+                return
+
+        checkpoint[title] = result
+        summarized += 1
+        if len(checkpoint) >= checkpoint_every:
+            store.write(dict(checkpoint), index_version)
+            checkpoint.clear()
+            logger.warning(f"Checkpoint: {summarized}/{len(pending)} titles summarized.")
+
+    await asyncio.gather(*[summarize(title) for title in pending])
+    store.write(checkpoint, index_version)
+
+    return summarized
+
+
+if __name__ == "__main__":
+    sum_logger = logging.getLogger()
+    sum_logger.setLevel(logging.WARNING)
+    console_handler = logging.StreamHandler()
+    sum_logger.addHandler(console_handler)
+
+    parser = argparse.ArgumentParser(description="Precompute the summaries of the whole catalog.")
+    parser.add_argument('--root-path', default='./')
+    parser.add_argument('--books-cfg', default='config/books_to_process.yaml')
+    parser.add_argument('--max-concurrency', type=int, default=2)
+    parser.add_argument('--checkpoint-every', type=int, default=10)
+    args = parser.parse_args()
+
+    summarizer_cfg = get_settings(args.root_path)['booksum_summarizer']
+    book_sum = BookSummarizer(
+        sum_logger,
+        root_path=args.root_path,
+        books_cfg_kb_filepath=args.books_cfg,
+        frac=1,
+        with_literacy=True,
+        cfg=summarizer_cfg
+    )
+    summary_store = book_sum.summary_store or SummaryStore(
+        os.path.join(args.root_path, summarizer_cfg['summary_store']['path']), index_version=book_sum.index_fingerprint
+    )
+
+    n_summarized = asyncio.run(precompute_summaries(
+        book_sum,
+        summary_store,
+        catalog_titles(args.root_path, args.books_cfg),
+        max_concurrency=args.max_concurrency,
+        checkpoint_every=args.checkpoint_every,
+        logger=sum_logger
+    ))
+    sum_logger.warning(f"Done: {n_summarized} titles summarized, {len(summary_store)} in the store.")
@@ -0,0 +1,130 @@
+from functools import partial
+from typing import Any, Sequence
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+)
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.llms.groq import Groq
+
+from booksum.utils.instrumentation import timed, record_llm_call
+from booksum.utils.rate_limiter import LLMRateLimiter, estimate_tokens, is_rate_limit_error
+
+
+def _messages_tokens(messages: Sequence[ChatMessage]) -> int:
+    return sum(estimate_tokens(str(message.content or "")) for message in messages)
+
+
+def _used_tokens(response) -> int | None:
+    return (getattr(response, 'additional_kwargs', None) or {}).get('total_tokens')
+
+
+class RateLimitedGroq(Groq):
+    """Groq LLM whose every call goes through the shared `LLMRateLimiter`
+
+    Both direct calls and the ones issued by response synthesizers (e.g. `TreeSummarize`) use the
+    same limiter, so the whole process stays within the provider budget.
+    """
+
+    _limiter: LLMRateLimiter = PrivateAttr()
+
+    def __init__(self, *args: Any, limiter: LLMRateLimiter, **kwargs: Any) -> None:
+        # retries are handled by the limiter
+        kwargs.setdefault('max_retries', 0)
+        super().__init__(*args, **kwargs)
+        self._limiter = limiter
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RateLimitedGroq"
+
+    def _guarded(self, fn, prompt_tokens: int):
+        with timed('llm_call'):
+            response = self._limiter.call(fn, prompt_tokens)
+        self._limiter.settle(prompt_tokens, _used_tokens(response))
+        record_llm_call(fn.func.__name__, prompt_tokens, response)
+        return response
+
+    async def _aguarded(self, fn, prompt_tokens: int):
+        with timed('llm_call'):
+            response = await self._limiter.acall(fn, prompt_tokens)
+        self._limiter.settle(prompt_tokens, _used_tokens(response))
+        record_llm_call(fn.func.__name__, prompt_tokens, response)
+        return response
+
+    def _guarded_stream(self, fn, prompt_tokens: int):
+        # the request is only sent once the generator is consumed, so a 429 surfaces on the first item
+        for attempt in range(self._limiter.max_retries + 1):
+            self._limiter.acquire(prompt_tokens)
+            gen = fn()
+            try:
+                first = next(gen)
+            except StopIteration:
+                return
+            except Exception as ex:
+                if not is_rate_limit_error(ex) or attempt == self._limiter.max_retries:
+                    raise
+                self._limiter.on_rate_limited(ex)
+                continue
+
+            self._limiter.on_success()
+            # streamed responses carry no usage, the prompt tokens are estimated
+            record_llm_call(fn.func.__name__, prompt_tokens)
+            yield first
+            yield from gen
+            return
+
+    async def _aguarded_stream(self, fn, prompt_tokens: int):
+        for attempt in range(self._limiter.max_retries + 1):
+            await self._limiter.aacquire(prompt_tokens)
+            gen = await fn()
+            try:
+                first = await gen.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception as ex:
+                if not is_rate_limit_error(ex) or attempt == self._limiter.max_retries:
+                    raise
+                self._limiter.on_rate_limited(ex)
+                continue
+
+            self._limiter.on_success()
+            record_llm_call(fn.func.__name__, prompt_tokens)
+            yield first
+            async for item in gen:
+                yield item
+            return
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return self._guarded(partial(super().chat, messages, **kwargs), _messages_tokens(messages))
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return self._guarded(partial(super().complete, prompt, formatted, **kwargs), estimate_tokens(prompt))
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        return self._guarded_stream(partial(super().stream_chat, messages, **kwargs), _messages_tokens(messages))
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        return self._guarded_stream(
+            partial(super().stream_complete, prompt, formatted, **kwargs), estimate_tokens(prompt)
+        )
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return await self._aguarded(partial(super().achat, messages, **kwargs), _messages_tokens(messages))
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return await self._aguarded(partial(super().acomplete, prompt, formatted, **kwargs), estimate_tokens(prompt))
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        return self._aguarded_stream(partial(super().astream_chat, messages, **kwargs), _messages_tokens(messages))
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseAsyncGen:
+        return self._aguarded_stream(
+            partial(super().astream_complete, prompt, formatted, **kwargs), estimate_tokens(prompt)
+        )
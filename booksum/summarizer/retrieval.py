@@ -0,0 +1,106 @@
+from typing import Any, List
+
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from booksum.summarizer.vector_store import MmapVectorStore
+from booksum.utils.instrumentation import record_context_nodes, timed
+
+
+class InstrumentedVectorIndexRetriever(VectorIndexRetriever):
+    """`VectorIndexRetriever` observing its duration (query embedding, vector search and node lookup)"""
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with timed('retrieval'):
+            return super()._retrieve(query_bundle)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with timed('retrieval'):
+            return await super()._aretrieve(query_bundle)
+
+
+class ContextPacker(BaseNodePostprocessor):
+    """Post-retrieval stage packing the retrieved chunks into a token budget before they are synthesized
+
+    Candidates are reranked by maximal marginal relevance (their retrieval similarity, penalized by their
+    similarity to the chunks already kept), near-duplicates of a kept chunk are dropped and chunks are kept
+    while their tokens (`Settings.tokenizer`, as the synthesizer counts them) fit `max_context_tokens`, so
+    TreeSummarize usually answers in one LLM call.
+    The most relevant chunk is always kept. Chunk embeddings are read from the vector store when it keeps them
+    (`MmapVectorStore`) and computed with `Settings.embed_model` otherwise.
+    """
+
+    mmr_lambda: float = 0.7
+    duplicate_threshold: float = 0.95
+    max_context_tokens: int = 3000
+
+    _vector_store: Any = PrivateAttr(default=None)
+
+    def __init__(self, vector_store=None, **kwargs: Any) -> None:
+        """
+        Args:
+            vector_store: vector store of the index the chunks are retrieved from
+            mmr_lambda (float): weight of the relevance against the diversity (1: relevance only)
+            duplicate_threshold (float): cosine similarity to a kept chunk above which a chunk is dropped
+            max_context_tokens (int): token budget of the chunks passed to the synthesizer
+        """
+        super().__init__(**kwargs)
+        self._vector_store = vector_store
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextPacker"
+
+    def _embeddings(self, nodes: List[NodeWithScore]) -> np.ndarray:
+        if isinstance(self._vector_store, MmapVectorStore):
+            embeddings = self._vector_store.get_embeddings([node.node.node_id for node in nodes])
+        else:
+            embeddings = np.asarray(Settings.embed_model.get_text_embedding_batch(
+                [node.node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+            ), dtype=np.float32)
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+    def _postprocess_nodes(self,
+                           nodes: List[NodeWithScore],
+                           query_bundle: QueryBundle | None = None) -> List[NodeWithScore]:
+        if len(nodes) <= 1:
+            return nodes
+
+        with timed('context_packing'):
+            embeddings = self._embeddings(nodes)
+            similarities = embeddings @ embeddings.T
+            relevance = np.asarray([node.score or 0.0 for node in nodes], dtype=np.float32)
+
+            # highest similarity of each candidate to the kept chunks
+            redundancy = np.zeros(len(nodes), dtype=np.float32)
+            candidates = list(range(len(nodes)))
+            kept, budget = [], self.max_context_tokens
+            duplicates, over_budget = 0, 0
+            while candidates and budget > 0:
+                best = max(candidates, key=lambda ix: self.mmr_lambda * relevance[ix]
+                           - (1 - self.mmr_lambda) * redundancy[ix])
+                candidates.remove(best)
+
+                if kept and redundancy[best] >= self.duplicate_threshold:
+                    duplicates += 1
+                    continue
+
+                tokens = len(Settings.tokenizer(nodes[best].node.get_content(metadata_mode=MetadataMode.LLM)))
+                if kept and tokens > budget:
+                    # a smaller candidate may still fit
+                    over_budget += 1
+                    continue
+
+                kept.append(best)
+                budget -= tokens
+                redundancy = np.maximum(redundancy, similarities[best])
+
+        record_context_nodes(kept=len(kept), duplicates=duplicates, over_budget=over_budget + len(candidates))
+        return [nodes[ix] for ix in kept]
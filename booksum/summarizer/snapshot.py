@@ -0,0 +1,425 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import List
+
+import pyarrow as pa
+from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+from llama_index.core.data_structs import IndexDict
+from llama_index.core.data_structs.data_structs import IndexStruct
+from llama_index.core.schema import NodeRelationship, ObjectType, RelatedNodeInfo, TextNode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.docstore.keyval_docstore import (
+    DEFAULT_COLLECTION_DATA_SUFFIX,
+    DEFAULT_METADATA_COLLECTION_SUFFIX,
+    DEFAULT_NAMESPACE,
+    DEFAULT_REF_DOC_COLLECTION_SUFFIX,
+)
+from llama_index.core.storage.docstore.utils import doc_to_json
+from llama_index.core.storage.index_store import SimpleIndexStore
+from llama_index.core.storage.kvstore import SimpleKVStore
+from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION
+
+from booksum.summarizer.vector_store import MmapVectorStore, MMAP_VECTOR_STORE_PREFIX
+from booksum.utils.io_ops import get_settings
+
+SNAPSHOT_DIR = "snapshot"
+SNAPSHOT_NODES_FILE = "nodes.arrow"
+SNAPSHOT_META_FILE = "snapshot.json"
+SNAPSHOT_VERSION = 2
+# node table of the version 1 snapshots, removed when they are re-exported
+_PARQUET_NODES_FILE = "nodes.parquet"
+# files of the JSON format a snapshot is exported from, it is stale once any of them changes
+_SOURCE_FILES = ("docstore.json", "index_store.json", f"{MMAP_VECTOR_STORE_PREFIX}_ids.json")
+
+# collections of the default `SimpleDocumentStore` namespace
+_NODE_COLLECTION = f"{DEFAULT_NAMESPACE}{DEFAULT_COLLECTION_DATA_SUFFIX}"
+_REF_DOC_COLLECTION = f"{DEFAULT_NAMESPACE}{DEFAULT_REF_DOC_COLLECTION_SUFFIX}"
+_METADATA_COLLECTION = f"{DEFAULT_NAMESPACE}{DEFAULT_METADATA_COLLECTION_SUFFIX}"
+
+_RELATIONSHIP_TYPE = pa.struct([
+    ('kind', pa.string()),
+    ('node_id', pa.string()),
+    ('node_type', pa.string()),
+    ('hash', pa.string()),
+    ('metadata', pa.string()),
+])
+NODES_SCHEMA = pa.schema([
+    ('vector_id', pa.string()),
+    ('node_id', pa.string()),
+    ('ref_doc_id', pa.string()),
+    ('node_hash', pa.string()),
+    ('text', pa.large_string()),
+    ('start_char_idx', pa.int64()),
+    ('end_char_idx', pa.int64()),
+    # JSON, null when empty (most nodes)
+    ('metadata', pa.string()),
+    ('excluded_embed_metadata_keys', pa.list_(pa.string())),
+    ('excluded_llm_metadata_keys', pa.list_(pa.string())),
+    ('relationships', pa.list_(_RELATIONSHIP_TYPE)),
+    ('mimetype', pa.string()),
+    ('text_template', pa.string()),
+    ('metadata_template', pa.string()),
+    ('metadata_seperator', pa.string()),
+])
+
+
+def _paths(index_path: str) -> dict:
+    snapshot_path = os.path.join(index_path, SNAPSHOT_DIR)
+    return {
+        'dir': snapshot_path,
+        'nodes': os.path.join(snapshot_path, SNAPSHOT_NODES_FILE),
+        'meta': os.path.join(snapshot_path, SNAPSHOT_META_FILE),
+    }
+
+
+def _source_stamp(index_path: str) -> dict:
+    stamp = {}
+    for file_name in _SOURCE_FILES:
+        file_path = os.path.join(index_path, file_name)
+        if os.path.exists(file_path):
+            stat = os.stat(file_path)
+            stamp[file_name] = [stat.st_size, stat.st_mtime_ns]
+    return stamp
+
+
+def _dumps(metadata: dict) -> str | None:
+    return json.dumps(metadata) if metadata else None
+
+
+def _loads(metadata: str | None) -> dict:
+    return json.loads(metadata) if metadata else {}
+
+
+def _node_record(vector_id: str, node: TextNode) -> dict:
+    relationships = []
+    for kind, related in node.relationships.items():
+        for info in (related if isinstance(related, list) else [related]):
+            relationships.append({
+                'kind': kind.value,
+                'node_id': info.node_id,
+                'node_type': info.node_type.value if info.node_type is not None else None,
+                'hash': info.hash,
+                'metadata': _dumps(info.metadata),
+            })
+
+    return {
+        'vector_id': vector_id,
+        'node_id': node.node_id,
+        'ref_doc_id': node.ref_doc_id,
+        'node_hash': node.hash,
+        'text': node.text,
+        'start_char_idx': node.start_char_idx,
+        'end_char_idx': node.end_char_idx,
+        'metadata': _dumps(node.metadata),
+        'excluded_embed_metadata_keys': node.excluded_embed_metadata_keys,
+        'excluded_llm_metadata_keys': node.excluded_llm_metadata_keys,
+        'relationships': relationships,
+        'mimetype': node.mimetype,
+        'text_template': node.text_template,
+        'metadata_template': node.metadata_template,
+        'metadata_seperator': node.metadata_seperator,
+    }
+
+
+def _node(record: dict) -> TextNode:
+    relationships = {}
+    for info in record['relationships']:
+        kind = NodeRelationship(info['kind'])
+        related = RelatedNodeInfo(
+            node_id=info['node_id'],
+            node_type=ObjectType(info['node_type']) if info['node_type'] is not None else None,
+            metadata=_loads(info['metadata']),
+            hash=info['hash'],
+        )
+        if kind == NodeRelationship.CHILD:
+            relationships.setdefault(kind, []).append(related)
+        else:
+            relationships[kind] = related
+
+    return TextNode(
+        id_=record['node_id'],
+        text=record['text'],
+        start_char_idx=record['start_char_idx'],
+        end_char_idx=record['end_char_idx'],
+        metadata=_loads(record['metadata']),
+        excluded_embed_metadata_keys=record['excluded_embed_metadata_keys'],
+        excluded_llm_metadata_keys=record['excluded_llm_metadata_keys'],
+        relationships=relationships,
+        mimetype=record['mimetype'],
+        text_template=record['text_template'],
+        metadata_template=record['metadata_template'],
+        metadata_seperator=record['metadata_seperator'],
+    )
+
+
+class _SnapshotKVStore(SimpleKVStore):
+    """`SimpleKVStore` whose docstore nodes are built from the snapshot table the first time they are read
+
+    Only the nodes a query retrieves are ever materialized; the whole table is materialized before persisting.
+    A read-only store builds the nodes on every read instead, so its memory does not grow with the nodes served.
+    """
+
+    def __init__(self, nodes: pa.Table, data: dict, read_only: bool = False) -> None:
+        super().__init__(data)
+        self._nodes = nodes
+        self._read_only = read_only
+        self._rows = {node_id: row for row, node_id in enumerate(nodes.column('node_id').to_pylist())}
+
+    def _materialize(self, rows: List[int]) -> None:
+        collection = self._data.setdefault(_NODE_COLLECTION, {})
+        for record in self._nodes.take(rows).to_pylist():
+            if self._rows.pop(record['node_id'], None) is not None:
+                collection[record['node_id']] = doc_to_json(_node(record))
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> dict | None:
+        row = self._rows.get(key) if collection == _NODE_COLLECTION else None
+        if row is not None and self._read_only:
+            return doc_to_json(_node(self._nodes.slice(row, 1).to_pylist()[0]))
+        if row is not None:
+            self._materialize([row])
+        return super().get(key, collection)
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> dict:
+        if collection == _NODE_COLLECTION and self._read_only:
+            nodes = dict(super().get_all(collection))
+            for record in self._nodes.take(list(self._rows.values())).to_pylist():
+                nodes[record['node_id']] = doc_to_json(_node(record))
+            return nodes
+        if collection == _NODE_COLLECTION and self._rows:
+            self._materialize(list(self._rows.values()))
+        return super().get_all(collection)
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        if collection == _NODE_COLLECTION:
+            self._rows.pop(key, None)
+        super().put(key, val, collection)
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        pending = collection == _NODE_COLLECTION and self._rows.pop(key, None) is not None
+        return super().delete(key, collection) or pending
+
+    def persist(self, persist_path: str, fs=None) -> None:
+        if self._read_only:
+            raise RuntimeError("A read-only index snapshot can not be persisted")
+        self.get_all(_NODE_COLLECTION)
+        super().persist(persist_path, fs=fs)
+
+
+class _SnapshotIndexStore(SimpleIndexStore):
+    """`SimpleIndexStore` keeping its index structs as objects, serialized only when persisting
+
+    The nodes dict of a large index takes longer to round trip through JSON than the whole snapshot takes to load.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._structs = {}
+
+    def add_index_struct(self, index_struct: IndexStruct) -> None:
+        self._structs[index_struct.index_id] = index_struct
+
+    def delete_index_struct(self, key: str) -> None:
+        self._structs.pop(key, None)
+        # it may have been serialized by a previous persist
+        super().delete_index_struct(key)
+
+    def get_index_struct(self, struct_id: str = None) -> IndexStruct | None:
+        if struct_id is None:
+            assert len(self._structs) == 1
+            return next(iter(self._structs.values()))
+        return self._structs.get(struct_id)
+
+    def index_structs(self) -> List[IndexStruct]:
+        return list(self._structs.values())
+
+    def _serialize(self) -> None:
+        for index_struct in self._structs.values():
+            super().add_index_struct(index_struct)
+
+    def persist(self, persist_path: str, fs=None) -> None:
+        self._serialize()
+        super().persist(persist_path, fs=fs)
+
+    def to_dict(self) -> dict:
+        self._serialize()
+        return super().to_dict()
+
+
+def snapshot_exists(index_path: str) -> bool:
+    paths = _paths(index_path)
+    return os.path.exists(paths['nodes']) and os.path.exists(paths['meta'])
+
+
+def snapshot_is_current(index_path: str) -> bool:
+    """True when the snapshot was exported from the JSON files currently persisted in `index_path`"""
+    if not snapshot_exists(index_path):
+        return False
+
+    with open(_paths(index_path)['meta'], 'r') as file:
+        meta = json.load(file)
+    return meta['version'] == SNAPSHOT_VERSION and meta['source'] == _source_stamp(index_path)
+
+
+def export_snapshot(index: VectorStoreIndex, index_path: str, batch_size: int = 1024) -> None:
+    """Writes the nodes of `index` (persisted in `index_path`) as an Arrow IPC file next to its embeddings
+
+    The file is uncompressed, so its columns are read in place from a memory map (Parquet pages would be decoded
+    into private buffers). The embeddings are not copied: the snapshot relies on the `.npy` matrix of the
+    `MmapVectorStore`.
+    """
+    if not isinstance(index.vector_store, MmapVectorStore):
+        raise ValueError("Index snapshots require the memory-mapped vector store (vector_store.type: mmap).")
+
+    paths = _paths(index_path)
+    os.makedirs(paths['dir'], exist_ok=True)
+
+    nodes_dict = index.index_struct.nodes_dict
+    vector_ids = list(nodes_dict.keys())
+    tmp_path = f"{paths['nodes']}.tmp"
+    with pa.ipc.new_file(tmp_path, NODES_SCHEMA) as writer:
+        for start in range(0, len(vector_ids), batch_size):
+            batch = vector_ids[start:start + batch_size]
+            nodes = index.docstore.get_nodes([nodes_dict[vector_id] for vector_id in batch])
+            for node in nodes:
+                if type(node) is not TextNode:
+                    raise ValueError(f"Node {node.node_id} is a {type(node).__name__}, snapshots only hold TextNodes.")
+            writer.write_table(pa.Table.from_pylist(
+                [_node_record(vector_id, node) for vector_id, node in zip(batch, nodes)], schema=NODES_SCHEMA
+            ))
+    os.replace(tmp_path, paths['nodes'])
+    if os.path.exists(os.path.join(paths['dir'], _PARQUET_NODES_FILE)):
+        os.remove(os.path.join(paths['dir'], _PARQUET_NODES_FILE))
+
+    # hashes of the source documents (the docstore metadata collection also holds the node hashes)
+    node_ids = set(nodes_dict.values())
+    document_hashes = {
+        doc_id: doc_hash for doc_hash, doc_id in index.docstore.get_all_document_hashes().items()
+        if doc_id not in node_ids
+    }
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'index_id': index.index_id,
+        'summary': index.index_struct.summary,
+        'document_hashes': document_hashes,
+        'source': _source_stamp(index_path),
+    }
+    with open(paths['meta'], 'w') as file:
+        json.dump(meta, file)
+
+
+def load_snapshot(index_path: str, vector_store: MmapVectorStore, read_only: bool = False) -> VectorStoreIndex:
+    """`VectorStoreIndex` of a snapshot: the node table is memory-mapped and nodes are built on demand
+
+    The columns of the table (texts, metadata...) are read in place from the mapped file, so their pages are
+    shared by every process mapping it. The id columns are still copied into per-process dicts (the index struct
+    and the docstore metadata).
+
+    Args:
+        index_path (str): persisted index directory
+        vector_store (MmapVectorStore): vector store persisted in `index_path`
+        read_only (bool): do not keep the nodes built, the index can not be persisted
+    """
+    paths = _paths(index_path)
+    with open(paths['meta'], 'r') as file:
+        meta = json.load(file)
+
+    # zero-copy: the buffers of the table point into the memory map
+    nodes = pa.ipc.open_file(pa.memory_map(paths['nodes'], 'r')).read_all()
+    columns = nodes.select(['vector_id', 'node_id', 'ref_doc_id', 'node_hash']).to_pydict()
+
+    # docstore collections other than the nodes: per node hash and reference document, per document node ids
+    metadata = {doc_id: {'doc_hash': doc_hash} for doc_id, doc_hash in meta['document_hashes'].items()}
+    ref_doc_info = {}
+    first_rows = {}
+    for row, (node_id, ref_doc_id, node_hash) in enumerate(
+            zip(columns['node_id'], columns['ref_doc_id'], columns['node_hash'])):
+        if ref_doc_id is None:
+            metadata[node_id] = {'doc_hash': node_hash}
+            continue
+        metadata[node_id] = {'doc_hash': node_hash, 'ref_doc_id': ref_doc_id}
+        if ref_doc_id not in ref_doc_info:
+            ref_doc_info[ref_doc_id] = {'node_ids': [], 'metadata': {}}
+            first_rows[ref_doc_id] = row
+        ref_doc_info[ref_doc_id]['node_ids'].append(node_id)
+
+    # a reference document carries the metadata of its first node (as `KVDocumentStore.add_documents` does)
+    node_metadata = nodes.column('metadata')
+    for ref_doc_id, row in first_rows.items():
+        ref_doc_info[ref_doc_id]['metadata'] = _loads(node_metadata[row].as_py())
+
+    kvstore = _SnapshotKVStore(
+        nodes, {_METADATA_COLLECTION: metadata, _REF_DOC_COLLECTION: ref_doc_info}, read_only=read_only
+    )
+
+    index_store = _SnapshotIndexStore()
+    index_store.add_index_struct(IndexDict(
+        index_id=meta['index_id'],
+        summary=meta['summary'],
+        nodes_dict=dict(zip(columns['vector_id'], columns['node_id']))
+    ))
+
+    storage_context = StorageContext.from_defaults(
+        docstore=SimpleDocumentStore(kvstore), index_store=index_store, vector_store=vector_store
+    )
+    return load_index_from_storage(storage_context, index_id=meta['index_id'])
+
+
+def verify_snapshot(index_path: str) -> list:
+    """Differences between the index loaded from the JSON files and from the snapshot (empty when they match)"""
+    json_index = load_index_from_storage(StorageContext.from_defaults(
+        persist_dir=index_path, vector_store=MmapVectorStore.from_persist_dir(index_path)
+    ))
+    snapshot_index = load_snapshot(index_path, MmapVectorStore.from_persist_dir(index_path))
+
+    differences = []
+    if json_index.index_id != snapshot_index.index_id:
+        differences.append(f"index id: {json_index.index_id} != {snapshot_index.index_id}")
+
+    json_nodes_dict = json_index.index_struct.nodes_dict
+    snapshot_nodes_dict = snapshot_index.index_struct.nodes_dict
+    if json_nodes_dict != snapshot_nodes_dict:
+        differences.append(f"nodes: {len(json_nodes_dict)} in JSON, {len(snapshot_nodes_dict)} in the snapshot")
+
+    for node_id in json_nodes_dict.values():
+        json_node = json_index.docstore.get_node(node_id)
+        snapshot_node = snapshot_index.docstore.get_node(node_id, raise_error=False)
+        if snapshot_node is None or json_node.dict() != snapshot_node.dict():
+            differences.append(f"node {node_id} differs")
+
+    if json_index.docstore.get_all_ref_doc_info() != snapshot_index.docstore.get_all_ref_doc_info():
+        differences.append("reference documents differ")
+    if json_index.docstore.get_all_document_hashes() != snapshot_index.docstore.get_all_document_hashes():
+        differences.append("document hashes differ")
+
+    return differences
+
+
+if __name__ == "__main__":
+    sum_logger = logging.getLogger()
+    sum_logger.setLevel(logging.WARNING)
+    console_handler = logging.StreamHandler()
+    sum_logger.addHandler(console_handler)
+
+    parser = argparse.ArgumentParser(description="Exports (and verifies) the binary snapshot of a persisted index.")
+    parser.add_argument('--index-path', default='models/index_with_literacy')
+    parser.add_argument('--verify', action='store_true', help="only compare the snapshot with the JSON index")
+    args = parser.parse_args()
+
+    if not args.verify:
+        # the one-off JSON -> mmap conversion of the vector store happens here when needed
+        from booksum.summarizer.indexer import IncrementalIndexer
+
+        vector_store_cfg = dict(get_settings('./')['booksum_summarizer']['vector_store'], type='mmap')
+        indexer = IncrementalIndexer(args.index_path, logger=sum_logger, vector_store_cfg=vector_store_cfg)
+        sum_logger.warning(f"Exporting the snapshot of {args.index_path}...")
+        export_snapshot(indexer.load(use_snapshot=False), args.index_path)
+
+    snapshot_differences = verify_snapshot(args.index_path)
+    for difference in snapshot_differences:
+        sum_logger.warning(difference)
+    sum_logger.warning("Snapshot matches the JSON index." if not snapshot_differences else
+                       f"{len(snapshot_differences)} differences.")
+    sys.exit(1 if snapshot_differences else 0)
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from booksum.utils.rate_limiter import estimate_tokens
+
+
+def create_stub_llm_app(latency: float = 0.2, tokens_per_second: float = 200.0, completion_tokens: int = 128) -> FastAPI:
+    """OpenAI compatible chat completions endpoint (the API Groq exposes) answering canned text
+
+    Args:
+        latency (float): seconds before the first token
+        tokens_per_second (float): generation rate of the completion tokens
+        completion_tokens (int): tokens of every completion
+    """
+    app = FastAPI(title="Stub LLM")
+    words = [f"token{i}" for i in range(completion_tokens)]
+
+    def completion(body: dict, prompt_tokens: int, chunk: dict = None) -> dict:
+        return {
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'object': 'chat.completion.chunk' if chunk is not None else 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [chunk if chunk is not None else {
+                'index': 0,
+                'message': {'role': 'assistant', 'content': " ".join(words)},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt_tokens = sum(estimate_tokens(str(message.get('content') or "")) for message in body['messages'])
+
+        if not body.get('stream', False):
+            await asyncio.sleep(latency + completion_tokens / tokens_per_second)
+            return JSONResponse(completion(body, prompt_tokens))
+
+        async def events():
+            await asyncio.sleep(latency)
+            for i, word in enumerate(words):
+                await asyncio.sleep(1 / tokens_per_second)
+                chunk = {'index': 0, 'delta': {'content': word if i == 0 else f" {word}"}, 'finish_reason': None}
+                yield f"data: {json.dumps(completion(body, prompt_tokens, chunk))}\n\n"
+            chunk = {'index': 0, 'delta': {}, 'finish_reason': 'stop'}
+            yield f"data: {json.dumps(completion(body, prompt_tokens, chunk))}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+class StubLLMServer:
+    """Serves `create_stub_llm_app` from a background thread (`api_base` is `http://<host>:<port>/v1`)"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, **stub_kwargs):
+        self.api_base = f"http://{host}:{port}/v1"
+        self._server = uvicorn.Server(
+            uvicorn.Config(create_stub_llm_app(**stub_kwargs), host=host, port=port, log_level='warning')
+        )
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self) -> "StubLLMServer":
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError(f"Stub LLM server could not start on {self.api_base}")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.should_exit = True
+        self._thread.join()
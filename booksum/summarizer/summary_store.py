@@ -0,0 +1,74 @@
+import glob
+import os
+import time
+
+import pandas as pd
+
+from booksum.summarizer.title_index import normalize_title
+from booksum.utils.hash import get_file_hash
+from booksum.utils.io_ops import to_parquet
+
+SUMMARY_STORE_COLUMNS = ['key', 'title', 'index_version', 'base-response', 'simple-rag',
+                         'with-literacy-know-how', 'created_at']
+
+
+def title_hash(title: str) -> str:
+    return get_file_hash(normalize_title(title))
+
+
+class SummaryStore:
+    """Precomputed catalog summaries, keyed by title hash and index version
+
+    Stored as a directory of Parquet parts (one per checkpoint of the batch job) and held in memory as a
+    dict, so a lookup is a single O(1) read.
+    """
+
+    def __init__(self, path: str, index_version: str = None):
+        """
+        Args:
+            path (str): directory of the Parquet parts
+            index_version (str): only load the summaries of this index version (None to load them all)
+        """
+        self.path = path
+        self._entries = {}
+
+        # the summaries of previous index versions are never served, they are filtered out while reading
+        filters = [('index_version', '==', index_version)] if index_version is not None else None
+        for part in sorted(glob.glob(os.path.join(path, "part-*.parquet"))):
+            for record in pd.read_parquet(part, engine='pyarrow', filters=filters).to_dict('records'):
+                self._entries[(record['key'], record['index_version'])] = record
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, title: str, index_version: str) -> dict | None:
+        return self._entries.get((title_hash(title), index_version))
+
+    def contains(self, title: str, index_version: str) -> bool:
+        return (title_hash(title), index_version) in self._entries
+
+    def write(self, summaries: dict, index_version: str) -> None:
+        """Persists a checkpoint of `title -> summarization result` as a new Parquet part"""
+        if not summaries:
+            return
+
+        now = time.time()
+        records = [
+            {
+                'key': title_hash(title),
+                'title': title,
+                'index_version': index_version,
+                'base-response': result['base-response'],
+                'simple-rag': result['simple-rag'],
+                'with-literacy-know-how': result['with-literacy-know-how'],
+                'created_at': now,
+            }
+            for title, result in summaries.items()
+        ]
+
+        os.makedirs(self.path, exist_ok=True)
+        part_path = os.path.join(self.path, f"part-{time.time_ns()}.parquet")
+        to_parquet(pd.DataFrame(records, columns=SUMMARY_STORE_COLUMNS), part_path)
+
+        for record in records:
+            self._entries[(record['key'], index_version)] = record
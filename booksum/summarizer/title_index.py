@@ -0,0 +1,85 @@
+import difflib
+import json
+import os
+import re
+from typing import Iterable
+
+TITLE_INDEX_FILE = "title_index.json"
+
+# booksum ids are "<title>.<chapter/act/...>" (e.g. "The Last of the Mohicans.chapter 1")
+_BOOKSUM_PART = re.compile(
+    r'(\.(chapter|chapters|act|scene|book|part|section|volume|canto|letter|stave|prologue|epilogue|'
+    r'introduction|preface)\b[^.]*)+$',
+    flags=re.IGNORECASE
+)
+_LEADING_ARTICLE = re.compile(r'^(the|a|an) ')
+
+
+def normalize_title(title: str) -> str:
+    """Case, punctuation, '&' and leading article insensitive form of a title"""
+    title = title.casefold().replace('&', ' and ')
+    title = re.sub(r'[^\w\s]', ' ', title)
+    title = re.sub(r'\s+', ' ', title).strip()
+    return _LEADING_ARTICLE.sub('', title)
+
+
+def title_of_doc_id(doc_id: str) -> str | None:
+    """Book title of an indexed document id (None for documents that are not books, e.g. web pages)"""
+    if re.match(r'^https?://', doc_id):
+        return None
+
+    return _BOOKSUM_PART.sub('', doc_id)
+
+
+class TitleIndex:
+    """Normalized book title -> indexed document ids (gutenberg `title` and booksum `book_id` documents)
+
+    Built at index time and persisted next to the index, so retrieval for a book title can be restricted
+    to the nodes of that book.
+    """
+
+    def __init__(self, titles: dict, shared_doc_ids: list = None, match_cutoff: float = 0.85):
+        """
+        Args:
+            titles (dict): normalized title -> document ids
+            shared_doc_ids (list): documents kept in every scoped search (e.g. literacy articles)
+            match_cutoff (float): minimum `difflib` similarity of a fuzzy title match
+        """
+        self.titles = titles
+        self.shared_doc_ids = shared_doc_ids or []
+        self.match_cutoff = match_cutoff
+
+    @classmethod
+    def from_doc_ids(cls, doc_ids: Iterable[str], **kwargs) -> "TitleIndex":
+        titles, shared_doc_ids = {}, []
+        for doc_id in doc_ids:
+            title = title_of_doc_id(doc_id)
+            if title is None:
+                shared_doc_ids.append(doc_id)
+            else:
+                titles.setdefault(normalize_title(title), []).append(doc_id)
+
+        return cls(titles, shared_doc_ids, **kwargs)
+
+    def save(self, index_path: str) -> None:
+        with open(os.path.join(index_path, TITLE_INDEX_FILE), 'w') as file:
+            json.dump({'titles': self.titles, 'shared_doc_ids': self.shared_doc_ids}, file)
+
+    @classmethod
+    def load(cls, index_path: str, **kwargs) -> "TitleIndex":
+        with open(os.path.join(index_path, TITLE_INDEX_FILE), 'r') as file:
+            data = json.load(file)
+
+        return cls(data['titles'], data['shared_doc_ids'], **kwargs)
+
+    def resolve(self, title: str) -> list | None:
+        """Document ids of `title` (exact normalized match first, then fuzzy), None when it is unknown"""
+        normalized = normalize_title(title)
+        doc_ids = self.titles.get(normalized)
+        if doc_ids is None:
+            matches = difflib.get_close_matches(normalized, self.titles.keys(), n=1, cutoff=self.match_cutoff)
+            if not matches:
+                return None
+            doc_ids = self.titles[matches[0]]
+
+        return doc_ids + self.shared_doc_ids
@@ -0,0 +1,342 @@
+import json
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+from booksum.summarizer.ann import ANN_TYPES, HnswAnnIndex
+from booksum.utils.instrumentation import timed
+
+MMAP_VECTOR_STORE_PREFIX = "mmap_vector_store"
+# derived from the embeddings, it may be (re)built when the store is loaded
+MMAP_VECTOR_STORE_ANN_FILE = f"{MMAP_VECTOR_STORE_PREFIX}_hnsw.bin"
+# rows converted to float32 at once when scanning a float16 matrix
+_SCAN_BLOCK_ROWS = 65536
+
+
+def _write_atomically(file_path: str, write) -> None:
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb') as file:
+        write(file)
+    os.replace(tmp_path, file_path)
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """Vector store keeping all the embeddings in one contiguous `.npy` matrix opened with `np.memmap`
+
+    Node ids and reference document ids are stored alongside as JSON; texts live in the index docstore
+    (`stores_text=False`), so it drops in under a `VectorStoreIndex`/`VectorIndexRetriever`. Top-k is a
+    single (blocked) matrix-vector product followed by `np.argpartition`, or an optional HNSW search
+    (`ann_cfg`) built when persisting. Nodes added after loading are kept in memory (and scanned exactly)
+    until the next `persist`, which also compacts deleted rows.
+    """
+
+    stores_text: bool = False
+    dtype: str = "float16"
+    ann_cfg: Dict[str, Any] = Field(default_factory=dict)
+
+    _embeddings: Any = PrivateAttr(default=None)
+    _norms: Any = PrivateAttr(default=None)
+    _node_ids: List[str] = PrivateAttr(default_factory=list)
+    _ref_doc_ids: List[str] = PrivateAttr(default_factory=list)
+    _deleted: Any = PrivateAttr(default=None)
+    _pending: List[tuple] = PrivateAttr(default_factory=list)
+    _dirty: bool = PrivateAttr(default=False)
+    _ann: Any = PrivateAttr(default=None)
+    _rows_by_ref_doc_id: Any = PrivateAttr(default=None)
+    _rows_by_node_id: Any = PrivateAttr(default=None)
+
+    def __init__(self, dtype: str = "float16", ann_cfg: dict = None, **kwargs: Any) -> None:
+        """
+        Args:
+            dtype (str): float16 or float32 embeddings on disk
+            ann_cfg (dict): `type` (none or hnsw) and the `HnswAnnIndex` parameters (M, ef_construction, ef_search)
+        """
+        super().__init__(dtype=dtype, ann_cfg=ann_cfg or {}, **kwargs)
+        self._deleted = np.zeros(0, dtype=bool)
+
+        if self.ann_cfg.get('type', 'none') not in ANN_TYPES:
+            raise ValueError(f"{self.ann_cfg['type']} is not part of {ANN_TYPES}")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    # -------------------------------------
+    # persistence
+    @staticmethod
+    def _paths(persist_dir: str) -> dict:
+        prefix = os.path.join(persist_dir, MMAP_VECTOR_STORE_PREFIX)
+        return {
+            'embeddings': f"{prefix}.npy",
+            'norms': f"{prefix}_norms.npy",
+            'ids': f"{prefix}_ids.json",
+            'ann': os.path.join(persist_dir, MMAP_VECTOR_STORE_ANN_FILE),
+        }
+
+    @classmethod
+    def exists(cls, persist_dir: str) -> bool:
+        # the ANN index is optional (and rebuilt when missing)
+        paths = cls._paths(persist_dir)
+        return all(os.path.exists(paths[name]) for name in ('embeddings', 'norms', 'ids'))
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, ann_cfg: dict = None, **kwargs: Any) -> "MmapVectorStore":
+        paths = cls._paths(persist_dir)
+        embeddings = np.load(paths['embeddings'], mmap_mode='r')
+
+        store = cls(dtype=str(embeddings.dtype), ann_cfg=ann_cfg)
+        store._embeddings = embeddings
+        store._norms = np.load(paths['norms'], mmap_mode='r')
+        with open(paths['ids'], 'r') as file:
+            ids = json.load(file)
+        store._node_ids = ids['node_ids']
+        store._ref_doc_ids = ids['ref_doc_ids']
+        store._deleted = np.zeros(len(store._node_ids), dtype=bool)
+        store._setup_ann(paths['ann'])
+
+        return store
+
+    @classmethod
+    def from_simple_vector_store(cls,
+                                 simple_store: SimpleVectorStore,
+                                 dtype: str = "float16",
+                                 ann_cfg: dict = None) -> "MmapVectorStore":
+        """Converts llama-index's JSON `SimpleVectorStore`"""
+        data = simple_store.data
+        store = cls(dtype=dtype, ann_cfg=ann_cfg)
+        for node_id, embedding in data.embedding_dict.items():
+            store._pending.append(
+                (node_id, data.text_id_to_ref_doc_id.get(node_id), np.asarray(embedding, dtype=store.dtype))
+            )
+        store._dirty = True
+
+        return store
+
+    def persist(self, persist_path: str, fs: Any = None) -> None:
+        """Writes the store next to `persist_path` (the path llama-index gives to the default vector store)"""
+        if not self._dirty:
+            return
+
+        paths = self._paths(os.path.dirname(persist_path))
+        os.makedirs(os.path.dirname(paths['embeddings']) or '.', exist_ok=True)
+
+        keep = ~self._deleted
+        blocks = []
+        if self._embeddings is not None and keep.any():
+            blocks.append(np.asarray(self._embeddings[keep], dtype=self.dtype))
+        if self._pending:
+            blocks.append(np.asarray([embedding for _, _, embedding in self._pending], dtype=self.dtype))
+        embeddings = np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=self.dtype)
+        norms = np.linalg.norm(embeddings.astype(np.float32), axis=1) if len(embeddings) else np.zeros(0)
+        norms[norms == 0] = 1.0
+
+        node_ids = [node_id for node_id, deleted in zip(self._node_ids, self._deleted) if not deleted]
+        ref_doc_ids = [ref_id for ref_id, deleted in zip(self._ref_doc_ids, self._deleted) if not deleted]
+        node_ids += [node_id for node_id, _, _ in self._pending]
+        ref_doc_ids += [ref_doc_id for _, ref_doc_id, _ in self._pending]
+
+        ids = json.dumps({'node_ids': node_ids, 'ref_doc_ids': ref_doc_ids}).encode("utf-8")
+
+        _write_atomically(paths['embeddings'], lambda file: np.save(file, embeddings))
+        _write_atomically(paths['norms'], lambda file: np.save(file, norms.astype(np.float32)))
+        _write_atomically(paths['ids'], lambda file: file.write(ids))
+
+        # reopen what was just written as a memory map
+        self._embeddings = np.load(paths['embeddings'], mmap_mode='r')
+        self._norms = np.load(paths['norms'], mmap_mode='r')
+        self._node_ids = node_ids
+        self._ref_doc_ids = ref_doc_ids
+        self._deleted = np.zeros(len(node_ids), dtype=bool)
+        self._pending = []
+        self._dirty = False
+        self._rows_by_ref_doc_id = None
+        self._rows_by_node_id = None
+
+        # rows were renumbered by the compaction
+        if os.path.exists(paths['ann']):
+            os.remove(paths['ann'])
+        self._setup_ann(paths['ann'])
+
+    def _setup_ann(self, ann_path: str) -> None:
+        """Loads the persisted ANN index, building (and persisting) it when missing or stale"""
+        self._ann = None
+        if self.ann_cfg.get('type', 'none') == 'none' or self._embeddings is None or len(self._embeddings) == 0:
+            return
+
+        params = {key: value for key, value in self.ann_cfg.items() if key != 'type'}
+        self._ann = HnswAnnIndex(dim=self._embeddings.shape[1], **params)
+        if os.path.exists(ann_path):
+            self._ann.load(ann_path, max_elements=len(self._embeddings))
+            if self._ann.size == len(self._embeddings):
+                return
+
+        self._ann.build(self._embeddings)
+        self._ann.save(ann_path)
+
+    # -------------------------------------
+    # writes
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        # held as arrays of the store dtype until persisted, not as lists of Python floats
+        for node in nodes:
+            self._pending.append((node.node_id, node.ref_doc_id, np.asarray(node.get_embedding(), dtype=self.dtype)))
+        self._dirty = True
+
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        for row in self._ref_doc_rows().get(ref_doc_id, []):
+            if not self._deleted[row]:
+                self._deleted[row] = True
+                if self._ann is not None:
+                    self._ann.mark_deleted(row)
+        self._pending = [item for item in self._pending if item[1] != ref_doc_id]
+        self._dirty = True
+
+    # -------------------------------------
+    # search
+    def _ref_doc_rows(self) -> dict:
+        """Persisted rows of each reference document (built once per persisted matrix)"""
+        if self._rows_by_ref_doc_id is None:
+            self._rows_by_ref_doc_id = {}
+            for row, ref_doc_id in enumerate(self._ref_doc_ids):
+                self._rows_by_ref_doc_id.setdefault(ref_doc_id, []).append(row)
+
+        return self._rows_by_ref_doc_id
+
+    def _candidate_rows(self, query: VectorStoreQuery) -> np.ndarray | None:
+        """Persisted rows the query is restricted to (None for all of them)"""
+        if query.doc_ids is not None:
+            rows_by_ref_doc_id = self._ref_doc_rows()
+            rows = [row for doc_id in set(query.doc_ids) for row in rows_by_ref_doc_id.get(doc_id, [])]
+            return np.asarray(sorted(rows), dtype=np.int64)
+
+        if query.node_ids is not None:
+            wanted = set(query.node_ids)
+            return np.asarray([row for row, node_id in enumerate(self._node_ids) if node_id in wanted], dtype=np.int64)
+
+        return None
+
+    def _persisted_scores(self, query_embedding: np.ndarray, rows: np.ndarray | None) -> np.ndarray:
+        if self._embeddings is None or len(self._embeddings) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        if rows is not None:
+            scores = np.asarray(self._embeddings[rows], dtype=np.float32) @ query_embedding
+            scores /= self._norms[rows]
+            scores[self._deleted[rows]] = -np.inf
+            return scores
+
+        scores = np.empty(len(self._embeddings), dtype=np.float32)
+        for start in range(0, len(self._embeddings), _SCAN_BLOCK_ROWS):
+            block = np.asarray(self._embeddings[start:start + _SCAN_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query_embedding
+        scores /= self._norms
+        scores[self._deleted] = -np.inf
+        return scores
+
+    def _pending_scores(self, query_embedding: np.ndarray, pending: list) -> np.ndarray:
+        if not pending:
+            return np.zeros(0, dtype=np.float32)
+
+        pending_embeddings = np.asarray([embedding for _, _, embedding in pending], dtype=np.float32)
+        pending_norms = np.linalg.norm(pending_embeddings, axis=1)
+        pending_norms[pending_norms == 0] = 1.0
+        return pending_embeddings @ query_embedding / pending_norms
+
+    def search(self,
+               query_embedding,
+               top_k: int,
+               rows: np.ndarray | None = None,
+               pending: list | None = None,
+               exact: bool = False) -> tuple:
+        """Top-k node ids and cosine similarities
+
+        Args:
+            query_embedding: query vector
+            top_k (int): number of neighbours
+            rows: persisted rows the search is restricted to (None for all of them)
+            pending: not yet persisted (node_id, ref_doc_id, embedding) entries to search (None for all of them)
+            exact (bool): scan every row even when an ANN index is available
+
+        Returns:
+            (node_ids, similarities)
+        """
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        query_embedding = query_embedding / (np.linalg.norm(query_embedding) or 1.0)
+        pending = self._pending if pending is None else pending
+
+        if rows is None and not exact and self._ann is not None:
+            active = len(self._deleted) - int(self._deleted.sum())
+            candidate_rows, scores = self._ann.search(query_embedding, min(top_k, active))
+        else:
+            scores = self._persisted_scores(query_embedding, rows)
+            candidate_rows = np.arange(len(scores)) if rows is None else rows
+
+        n_candidates = len(candidate_rows)
+        scores = np.concatenate([np.asarray(scores, dtype=np.float32), self._pending_scores(query_embedding, pending)])
+
+        top_k = min(top_k, int(np.isfinite(scores).sum()))
+        if top_k == 0:
+            return [], []
+
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+
+        node_ids = [
+            self._node_ids[candidate_rows[ix]] if ix < n_candidates else pending[ix - n_candidates][0]
+            for ix in top
+        ]
+        return node_ids, scores[top].tolist()
+
+    def get_embeddings(self, node_ids: List[str]) -> np.ndarray:
+        """float32 embeddings of `node_ids`, one row per node id (zeros for unknown ids)"""
+        if self._rows_by_node_id is None:
+            self._rows_by_node_id = {node_id: row for row, node_id in enumerate(self._node_ids)}
+        pending = {node_id: embedding for node_id, _, embedding in self._pending}
+
+        dim = self._embeddings.shape[1] if self._embeddings is not None and self._embeddings.ndim == 2 else 0
+        if not dim and pending:
+            dim = len(next(iter(pending.values())))
+        embeddings = np.zeros((len(node_ids), dim), dtype=np.float32)
+        for ix, node_id in enumerate(node_ids):
+            if node_id in pending:
+                embeddings[ix] = pending[node_id]
+            elif node_id in self._rows_by_node_id:
+                embeddings[ix] = self._embeddings[self._rows_by_node_id[node_id]]
+
+        return embeddings
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise NotImplementedError("Metadata filters are not supported by MmapVectorStore, use doc_ids.")
+
+        pending = self._pending
+        if query.doc_ids is not None:
+            doc_ids = set(query.doc_ids)
+            pending = [item for item in pending if item[1] in doc_ids]
+        elif query.node_ids is not None:
+            node_id_set = set(query.node_ids)
+            pending = [item for item in pending if item[0] in node_id_set]
+
+        with timed('vector_search'):
+            node_ids, similarities = self.search(
+                query.query_embedding,
+                query.similarity_top_k,
+                rows=self._candidate_rows(query),
+                pending=pending
+            )
+
+        return VectorStoreQueryResult(nodes=None, similarities=similarities, ids=node_ids)
@@ -1,30 +1,29 @@
 import logging
 import os
-import re
 
-import nltk
 import numpy as np
 import pandas as pd
 import yaml
 from bertopic import BERTopic
 from bertopic.representation import KeyBERTInspired
 from hdbscan import HDBSCAN
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from sentence_transformers import SentenceTransformer
 from umap import UMAP
 
-from booksum.utils.get_gutenberg import get_by_book_id
-from booksum.utils.io_ops import to_pickle, to_parquet, load_pickle, load_parquet
+from booksum.topic_modeling.preprocessing import clean_text, preprocess, clean_books  # noqa: F401
+from booksum.utils.embeddings import DEFAULT_EMBEDDING_CFG, load_sentence_transformer
+from booksum.utils.get_gutenberg import fetch_books_to_parquet
+from booksum.utils.io_ops import to_pickle, to_parquet, load_pickle, load_parquet, get_settings
 from booksum.utils.hash import get_file_hash
 
 
-def create_embeddings(bks: list, file_path, model="all-MiniLM-L6-v2", just_load=False):
-    embedding_model = SentenceTransformer(model, trust_remote_code=True)
+def create_embeddings(bks: list, file_path, model="all-MiniLM-L6-v2", just_load=False, embedding_cfg: dict = None):
+    # same device/backend selection as the summarizer index (see `booksum_summarizer.embedding`)
+    embedding_cfg = {**DEFAULT_EMBEDDING_CFG, 'model_name': model, **(embedding_cfg or {})}
+    embedding_model = load_sentence_transformer(embedding_cfg, trust_remote_code=True)
     if just_load:
         return embedding_model, None
 
-    embeddings = embedding_model.encode(bks, show_progress_bar=True)
+    embeddings = embedding_model.encode(bks, batch_size=embedding_cfg['batch_size'], show_progress_bar=True)
 
     # save embeddings
     to_pickle(embeddings, file_path)
@@ -35,7 +34,8 @@ def analyze_topics(
         data_path_prefix: str,
         models_path_prefix: str,
         experiment_md5: str,
-        bks: pd.DataFrame
+        bks: pd.DataFrame,
+        embedding_cfg: dict = None
 ):
     logging.getLogger().setLevel(logging.INFO)
     all_books = np.concatenate(bks['sentences'].tolist(), axis=0)
@@ -45,11 +45,13 @@ def analyze_topics(
     embeddings_and_model_file_path = os.path.join(models_path_prefix, f"{experiment_md5}_embeddings.pkl")
     if not os.path.exists(embeddings_and_model_file_path):
         logging.info("Creating embeddings and model ...")
-        embedding_model, embeddings = create_embeddings(all_books, embeddings_and_model_file_path)
+        embedding_model, embeddings = create_embeddings(
+            all_books, embeddings_and_model_file_path, embedding_cfg=embedding_cfg
+        )
     else:
         logging.info("Loading embeddings and model ...")
         embeddings = load_pickle(embeddings_and_model_file_path)
-        embedding_model, _ = create_embeddings([], None, just_load=True)
+        embedding_model, _ = create_embeddings([], None, just_load=True, embedding_cfg=embedding_cfg)
 
     # 2. preventing stochastic behaviour
     umap_model = UMAP(n_neighbors=15, n_components=3, metric='cosine', random_state=65535)
@@ -86,44 +88,11 @@ def analyze_topics(
     to_pickle(topics, topics_file_path)
 
 
-def clean_text(text):
-    text = text.decode(encoding="utf-8")
-    text = re.sub(r'[\n\t\r]', ' ', text)  # Remove newlines and tabs
-    text = re.sub(r'\s+', ' ', text).strip()  # Remove multiple spaces
-    return text
-
-
-def preprocess(text):
-    # Remove non-alphabetic characters
-    text = re.sub(r'\W', ' ', text)
-
-    # Tokenize
-    tokens = nltk.word_tokenize(text)
-
-    # Convert to lower case
-    tokens = [token.lower() for token in tokens]
-
-    # Remove stopwords
-    stop_words = set(stopwords.words('english'))
-    tokens = [token for token in tokens if token not in stop_words]
-
-    # Lemmatize
-    lemmatizer = WordNetLemmatizer()
-    tokens = [lemmatizer.lemmatize(token) for token in tokens]
-
-    return tokens
-
-
-def clean_books(bks: pd.DataFrame) -> pd.DataFrame:
-    bks['book-clean'] = bks['book'].apply(clean_text)
-    bks['sentences'] = bks['book-clean'].apply(nltk.sent_tokenize)
-    return bks
-
-
 if __name__ == "__main__":
     logging.getLogger().setLevel(logging.INFO)
 
     data_file_path_prefix = 'data/cache'
+    gutenberg_cache_path = 'data/cache/gutenberg'
     data_processed_file_path_prefix = 'data/processed/'
     models_file_path_prefix = 'models/'
     cfg_kb_filepath = "config/books_to_process.yaml"
@@ -141,8 +110,13 @@ if __name__ == "__main__":
 
     if not os.path.exists(file_path_raw):
         logging.info('Downloading books..')
-        books = get_by_book_id(books_ids)
-        to_parquet(books, file_path_raw)
+        # GUTENBERG_MIRROR_DIR points to a local mirror (<id>.txt files) to work offline
+        fetch_books_to_parquet(
+            books_ids,
+            file_path_raw,
+            cache_dir=gutenberg_cache_path,
+            mirror_dir=os.getenv("GUTENBERG_MIRROR_DIR")
+        )
 
     if not os.path.exists(file_path_clean):
         logging.info('Books already downloaded. Loading from disk..')
@@ -156,5 +130,6 @@ if __name__ == "__main__":
         data_processed_file_path_prefix,
         models_file_path_prefix,
         experiment_md5=data_sha,
-        bks=books_clean
+        bks=books_clean,
+        embedding_cfg=get_settings('./')['booksum_summarizer']['embedding']
     )
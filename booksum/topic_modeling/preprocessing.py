@@ -0,0 +1,79 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Iterator
+
+import nltk
+import pandas as pd
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+
+# kept free of the topic modeling stack so that pool workers stay light
+_WHITESPACES = re.compile(r'\s+')
+_NON_ALPHANUMERIC = re.compile(r'\W')
+
+
+@lru_cache(maxsize=None)
+def _stop_words() -> frozenset:
+    return frozenset(stopwords.words('english'))
+
+
+@lru_cache(maxsize=None)
+def _lemmatizer() -> WordNetLemmatizer:
+    return WordNetLemmatizer()
+
+
+@lru_cache(maxsize=1 << 18)
+def _lemmatize(token: str) -> str:
+    return _lemmatizer().lemmatize(token)
+
+
+def clean_text(text):
+    text = text.decode(encoding="utf-8")
+    # newlines, tabs and runs of spaces become a single space
+    text = _WHITESPACES.sub(' ', text).strip()
+    return text
+
+
+def preprocess(text):
+    # Remove non-alphabetic characters
+    text = _NON_ALPHANUMERIC.sub(' ', text)
+
+    # Tokenize
+    tokens = nltk.word_tokenize(text)
+
+    # Convert to lower case and remove stopwords
+    stop_words = _stop_words()
+    tokens = [token for token in map(str.lower, tokens) if token not in stop_words]
+
+    # Lemmatize
+    return [_lemmatize(token) for token in tokens]
+
+
+def _clean_and_split(book: bytes) -> tuple:
+    clean_book = clean_text(book)
+    return clean_book, nltk.sent_tokenize(clean_book)
+
+
+def iter_clean_books(books: Iterable[bytes], n_jobs: int = None) -> Iterator[tuple]:
+    """Yields (clean book, sentences) in input order, sharding the books across `n_jobs` processes"""
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        yield from map(_clean_and_split, books)
+        return
+
+    with ProcessPoolExecutor(n_jobs) as executor:
+        # one book per task: books are large and uneven
+        yield from executor.map(_clean_and_split, books, chunksize=1)
+
+
+def clean_books(bks: pd.DataFrame, n_jobs: int = None) -> pd.DataFrame:
+    clean, sentences = [], []
+    for clean_book, book_sentences in iter_clean_books(bks['book'], n_jobs=n_jobs):
+        clean.append(clean_book)
+        sentences.append(book_sentences)
+
+    bks['book-clean'] = pd.Series(clean, index=bks.index, dtype=object)
+    bks['sentences'] = pd.Series(sentences, index=bks.index, dtype=object)
+    return bks
@@ -0,0 +1,119 @@
+import logging
+from typing import Any, List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+from booksum.utils.instrumentation import timed
+
+EMBEDDING_BACKENDS = ('torch', 'quantized', 'onnx')
+DEFAULT_EMBEDDING_CFG = {
+    'model_name': "all-MiniLM-L6-v2",
+    'device': "auto",
+    'backend': "torch",
+    'batch_size': 32,
+    'num_threads': 0,
+    'onnx_file_name': None,
+}
+
+
+def detect_device(device: str = "auto") -> str:
+    """Resolves `auto` to `cuda` when a GPU is available and to `cpu` otherwise"""
+    if device != "auto":
+        return device
+
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def load_sentence_transformer(cfg: dict = None, trust_remote_code: bool = False, logger=None):
+    """Loads a SentenceTransformer for the configured device and backend
+
+    Backends:
+        torch: the plain model
+        quantized: int8 dynamically quantized linear layers on CPU (float16 on GPU)
+        onnx: ONNX Runtime (requires `sentence-transformers>=3.2` with the `onnx` extra), optionally
+            loading a pre-quantized export given by `onnx_file_name`
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    cfg = {**DEFAULT_EMBEDDING_CFG, **(cfg or {})}
+    logger = logger or logging.getLogger(__name__)
+
+    if cfg['backend'] not in EMBEDDING_BACKENDS:
+        raise ValueError(f"{cfg['backend']} is not part of {EMBEDDING_BACKENDS}")
+
+    device = detect_device(cfg['device'])
+    if cfg['num_threads'] > 0:
+        torch.set_num_threads(cfg['num_threads'])
+    logger.warning(f"Loading embedding model {cfg['model_name']} ({cfg['backend']} backend on {device})...")
+
+    if cfg['backend'] == 'onnx':
+        model_kwargs = {'file_name': cfg['onnx_file_name']} if cfg['onnx_file_name'] else None
+        try:
+            return SentenceTransformer(cfg['model_name'], device=device, backend='onnx',
+                                       model_kwargs=model_kwargs, trust_remote_code=trust_remote_code)
+        except TypeError as ex:
+            raise ImportError("The onnx embedding backend requires sentence-transformers>=3.2 "
+                              "(pip install 'sentence-transformers[onnx]')") from ex
+
+    model = SentenceTransformer(cfg['model_name'], device=device, trust_remote_code=trust_remote_code)
+    if cfg['backend'] == 'quantized':
+        if device == 'cpu':
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        else:
+            model = model.half()
+
+    return model
+
+
+class SentenceTransformerEmbedding(BaseEmbedding):
+    """llama-index embedding over an already loaded SentenceTransformer (see `load_sentence_transformer`)"""
+
+    normalize: bool = Field(default=True, description="Normalize the embeddings.")
+
+    _model: Any = PrivateAttr()
+
+    def __init__(self, model, model_name: str, embed_batch_size: int = 32, normalize: bool = True, **kwargs: Any):
+        super().__init__(model_name=model_name, embed_batch_size=embed_batch_size, normalize=normalize, **kwargs)
+        self._model = model
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SentenceTransformerEmbedding"
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        return self._model.encode(
+            texts,
+            batch_size=self.embed_batch_size,
+            normalize_embeddings=self.normalize,
+            convert_to_numpy=True
+        ).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        with timed('query_embedding'):
+            return self._embed([query])[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embedding(text)
+
+
+def get_embed_model(cfg: dict = None, logger=None) -> SentenceTransformerEmbedding:
+    """Embedding model used both to build the index and to embed queries"""
+    cfg = {**DEFAULT_EMBEDDING_CFG, **(cfg or {})}
+
+    return SentenceTransformerEmbedding(
+        load_sentence_transformer(cfg, logger=logger),
+        model_name=cfg['model_name'],
+        embed_batch_size=cfg['batch_size']
+    )
@@ -1,23 +1,147 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import yaml
 
 import gutenbergpy.textget
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
+GUTENBERG_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('book', pa.binary()),
+    ('author', pa.string()),
+    ('title', pa.string()),
+])
 
-def get_by_book_id(books_by_author: dict) -> pd.DataFrame:
 
-    books_by_id = {'id': [], 'book': [], 'author': [], 'title': []}
+def _catalog(books_by_author: dict) -> list:
+    """(id, author, title) of every book of the config, in config order"""
+    return [
+        (books['id'], author['author'], books['title'])
+        for author in books_by_author['authors']
+        for books in author['list-of-books']
+    ]
+
+
+def fetch_raw_book(book_id: int,
+                   cache_dir: str = None,
+                   mirror_dir: str = None,
+                   retries: int = 3,
+                   backoff: float = 2.0) -> bytes:
+    """Raw book text, read from the per-book cache when present
+
+    Args:
+        book_id (int): gutenberg id
+        cache_dir (str): directory of the per-book cache (`<id>.txt`), None to disable it
+        mirror_dir (str): local mirror (`<id>.txt` files) used instead of the network
+        retries (int): attempts after a failed download
+        backoff (float): base of the exponential delay between attempts, in seconds
+    """
+    cache_path = os.path.join(cache_dir, f"{book_id}.txt") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'rb') as file:
+            return file.read()
+
+    for attempt in range(retries + 1):
+        try:
+            if mirror_dir:
+                with open(os.path.join(mirror_dir, f"{book_id}.txt"), 'rb') as file:
+                    raw_book = file.read()
+            else:
+                raw_book = gutenbergpy.textget.get_text_by_id(book_id)
+            break
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff ** attempt)
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(raw_book)
+        os.replace(tmp_path, cache_path)
+
+    return raw_book
+
+
+def _fetch_clean_book(book_id, cache_dir, mirror_dir, retries):
+    raw_book = fetch_raw_book(book_id, cache_dir=cache_dir, mirror_dir=mirror_dir, retries=retries)
+    return gutenbergpy.textget.strip_headers(raw_book)
+
 
-    for author in books_by_author['authors']:
-        author_name = author['author']
-        books_from_author_name = author['list-of-books']
-        for books in books_from_author_name:
-            book_id = books['id']
-            book_title = books['title']
+def fetch_books_to_parquet(books_by_author: dict,
+                           file_path: str,
+                           cache_dir: str = None,
+                           mirror_dir: str = None,
+                           max_workers: int = 8,
+                           retries: int = 3,
+                           logger=None) -> None:
+    """Downloads the books of the config concurrently and writes them to Parquet as they arrive
 
-            raw_book = gutenbergpy.textget.get_text_by_id(book_id)
-            clean_book = gutenbergpy.textget.strip_headers(raw_book)
+    Rows are written in config order (out-of-order books wait for their predecessors), and the file is
+    only moved to `file_path` once every book was fetched. Books already in `cache_dir` are not
+    downloaded again, so a failed run resumes with the missing ones.
+    """
+    logger = logger or logging.getLogger(__name__)
+    catalog = _catalog(books_by_author)
+    tmp_path = f"{file_path}.tmp"
 
+    failed = []
+    arrived = {}
+    next_row = 0
+    with pq.ParquetWriter(tmp_path, GUTENBERG_SCHEMA) as writer, ThreadPoolExecutor(max_workers) as executor:
+        futures = {
+            executor.submit(_fetch_clean_book, book_id, cache_dir, mirror_dir, retries): row
+            for row, (book_id, _, _) in enumerate(catalog)
+        }
+
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                arrived[row] = future.result()
+            except Exception as ex:
+                logger.warning(f"Failed to fetch book {catalog[row][0]}: {ex}")
+                failed.append(catalog[row][0])
+                arrived[row] = None
+
+            # write every book whose predecessors were all written
+            while next_row in arrived:
+                clean_book = arrived.pop(next_row)
+                if clean_book is not None:
+                    book_id, author_name, book_title = catalog[next_row]
+                    writer.write_table(pa.table(
+                        {'id': [book_id], 'book': [clean_book], 'author': [author_name], 'title': [book_title]},
+                        schema=GUTENBERG_SCHEMA
+                    ))
+                next_row += 1
+
+    if failed:
+        os.remove(tmp_path)
+        raise RuntimeError(f"Could not fetch books {failed}; fetched books are cached, re-run to resume.")
+
+    os.replace(tmp_path, file_path)
+
+
+def get_by_book_id(books_by_author: dict,
+                   cache_dir: str = None,
+                   mirror_dir: str = None,
+                   max_workers: int = 8,
+                   retries: int = 3) -> pd.DataFrame:
+
+    books_by_id = {'id': [], 'book': [], 'author': [], 'title': []}
+
+    catalog = _catalog(books_by_author)
+    with ThreadPoolExecutor(max_workers) as executor:
+        clean_books = executor.map(
+            lambda book: _fetch_clean_book(book[0], cache_dir, mirror_dir, retries), catalog
+        )
+
+        for (book_id, author_name, book_title), clean_book in zip(catalog, clean_books):
             books_by_id['id'].append(book_id)
             books_by_id['book'].append(clean_book)
             books_by_id['author'].append(author_name)
@@ -32,5 +156,4 @@ if __name__ == "__main__":
     with open('../../config/books_to_process.yaml', 'r') as file:
         books_ids = yaml.safe_load(file)
 
-    get_by_book_id(books_ids)
-
+    get_by_book_id(books_ids, cache_dir='../../data/cache/gutenberg')
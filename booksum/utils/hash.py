@@ -1,6 +1,27 @@
+import os
 from hashlib import sha256
 
 
 def get_file_hash(identity: str):
     data_md5 = str(sha256(identity.encode("utf-8", "surrogatepass")).hexdigest())
     return data_md5
+
+
+def get_dir_fingerprint(dir_path: str, exclude: tuple = ()):
+    """Hash of the file names, sizes and modification times under `dir_path` (changes whenever it is rebuilt)
+
+    Args:
+        dir_path (str): directory
+        exclude (tuple): files and sub-directories (relative to `dir_path`) holding derived artifacts to ignore
+    """
+    entries = []
+    for root, dirs, files in os.walk(dir_path):
+        if root == dir_path:
+            dirs[:] = [dir_name for dir_name in dirs if dir_name not in exclude]
+            files = [file_name for file_name in files if file_name not in exclude]
+        for file_name in sorted(files):
+            file_path = os.path.join(root, file_name)
+            stat = os.stat(file_path)
+            entries.append(f"{os.path.relpath(file_path, dir_path)}:{stat.st_size}:{stat.st_mtime_ns}")
+
+    return get_file_hash("|".join(sorted(entries)))
@@ -0,0 +1,113 @@
+import contextvars
+import os
+from contextlib import contextmanager
+
+import anyio.to_thread
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# set (to an empty directory) before the service workers start, their metrics are aggregated from there
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+# seconds, from a cached lookup to a full tree summarization
+_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    'booksum_stage_seconds',
+    "Duration of a summarization stage",
+    ['stage'],
+    buckets=_SECONDS_BUCKETS
+)
+LLM_CALLS = Counter('booksum_llm_calls_total', "LLM calls", ['kind'])
+LLM_TOKENS = Counter(
+    'booksum_llm_tokens_total',
+    "LLM tokens, as reported by the provider (prompt tokens are estimated when it does not)",
+    ['type']
+)
+LLM_CALLS_PER_RESPONSE = Histogram(
+    'booksum_llm_calls_per_response',
+    "LLM calls issued to produce one response (tree summarize reduction rounds)",
+    ['mode'],
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32, 64)
+)
+CACHE_LOOKUPS = Counter('booksum_cache_lookups_total', "Summary cache lookups", ['cache', 'result'])
+CONTEXT_NODES = Counter(
+    'booksum_context_nodes_total',
+    "Retrieved chunks by outcome of the context packing (kept, duplicate or over the token budget)",
+    ['outcome']
+)
+THREADPOOL_BUSY = Gauge(
+    'booksum_threadpool_busy_threads',
+    "Worker threads running blocking summarizations",
+    multiprocess_mode='livesum'
+)
+THREADPOOL_QUEUED = Gauge(
+    'booksum_threadpool_queued_tasks',
+    "Blocking summarizations waiting for a worker thread",
+    multiprocess_mode='livesum'
+)
+
+# LLM calls of the response being computed (shared with the tasks it spawns)
+_llm_calls = contextvars.ContextVar('booksum_llm_calls', default=None)
+
+
+def timed(stage: str):
+    """Context manager (or decorator) observing the duration of `stage`"""
+    return STAGE_SECONDS.labels(stage).time()
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_context_nodes(kept: int, duplicates: int, over_budget: int) -> None:
+    CONTEXT_NODES.labels('kept').inc(kept)
+    CONTEXT_NODES.labels('duplicate').inc(duplicates)
+    CONTEXT_NODES.labels('over_budget').inc(over_budget)
+
+
+def record_llm_call(kind: str, prompt_tokens: int, response=None) -> None:
+    """Counts a call and its tokens (the usage reported in `response.additional_kwargs`, when any)"""
+    LLM_CALLS.labels(kind).inc()
+    usage = (getattr(response, 'additional_kwargs', None) or {})
+    LLM_TOKENS.labels('prompt').inc(usage.get('prompt_tokens') or prompt_tokens)
+    if usage.get('completion_tokens'):
+        LLM_TOKENS.labels('completion').inc(usage['completion_tokens'])
+
+    calls = _llm_calls.get()
+    if calls is not None:
+        calls[0] += 1
+
+
+@contextmanager
+def count_llm_calls(mode: str):
+    """Observes the number of LLM calls issued within the block (and the tasks it spawns)"""
+    calls = [0]
+    token = _llm_calls.set(calls)
+    try:
+        yield
+    finally:
+        _llm_calls.reset(token)
+        LLM_CALLS_PER_RESPONSE.labels(mode).observe(calls[0])
+
+
+def observe_threadpool() -> None:
+    """Updates the threadpool gauges from the limiter of `run_in_threadpool` (called from the event loop)"""
+    statistics = anyio.to_thread.current_default_thread_limiter().statistics()
+    THREADPOOL_BUSY.set(statistics.borrowed_tokens)
+    THREADPOOL_QUEUED.set(statistics.tasks_waiting)
+
+
+def metrics_payload() -> bytes:
+    """Latest metrics in the Prometheus text format, summed over the live worker processes in multiprocess mode"""
+    if MULTIPROC_DIR_ENV not in os.environ:
+        return generate_latest()
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def mark_process_dead() -> None:
+    """Drops the live gauges of the exiting worker process (multiprocess mode)"""
+    if MULTIPROC_DIR_ENV in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
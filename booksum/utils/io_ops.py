@@ -1,50 +1,80 @@
+import bisect
 import json
 import os
 import pickle
 
 import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import yaml
 
 
 class BookSumDataSetIO:
-    def __init__(self, data_path):
-        self.booksum = load_parquet(
-            os.path.join(data_path, "booksum.parquet")
-        )
+    def __init__(self, data_path, lazy=False):
+        """
+        Args:
+            data_path (str): directory of `booksum.parquet`
+            lazy (bool): leaves the `chapter` texts on disk, they are read (by row group) when a row is accessed
+        """
+        file_path = os.path.join(data_path, "booksum.parquet")
+        columns = None
+        self._parquet_file, self._row_group_starts = None, [0]
+        if lazy:
+            self._parquet_file = pq.ParquetFile(file_path)
+            columns = [name for name in self._parquet_file.schema_arrow.names if name != 'chapter']
+            # first row of each row group
+            for row_group in range(self._parquet_file.num_row_groups - 1):
+                self._row_group_starts.append(
+                    self._row_group_starts[-1] + self._parquet_file.metadata.row_group(row_group).num_rows
+                )
+        self.booksum = load_parquet(file_path, columns=columns)
+
+        # first row of each book_id / bid, instead of a scan per lookup
+        self._rows_by_book_id = _first_rows(self.booksum['book_id'])
+        self._rows_by_bid = _first_rows(self.booksum['bid'])
+        self._summaries = {}
+        self._chapters_row_group = (None, None)
+
+    def _summary(self, row):
+        summary = self._summaries.get(row)
+        if summary is None:
+            summary = self._summaries[row] = json.loads(self.booksum['summary'].iat[row])['summary']
+        return summary
+
+    def _chapter(self, row):
+        if self._parquet_file is None:
+            return self.booksum['chapter'].iat[row]
+
+        row_group = bisect.bisect_right(self._row_group_starts, row) - 1
+        # consecutive lookups usually hit the same row group
+        if self._chapters_row_group[0] != row_group:
+            chapters = self._parquet_file.read_row_group(row_group, columns=['chapter']).column('chapter')
+            self._chapters_row_group = (row_group, chapters)
+        return self._chapters_row_group[1][row - self._row_group_starts[row_group]].as_py()
+
+    def _row(self, row):
+        return self.booksum['bid'].iat[row], self._summary(row), self._chapter(row), self.booksum.index[row]
 
     def get_booksum_summary_and_chapter_by_name_and_chapter(self, book_chapter_name):
         # just return the first entry
-        book = self.booksum[(self.booksum["book_id"] == book_chapter_name)][['bid', 'summary', 'chapter']].iloc[0]
-        book_parquet_ref = self.booksum[(self.booksum["book_id"] == book_chapter_name)].iloc[0].name
-        summary_dict = book['summary']
-        summary = json.loads(summary_dict)['summary']
-
-        chapter = book['chapter']
-        bid = book['bid']
-
+        bid, summary, chapter, book_parquet_ref = self._row(self._rows_by_book_id[book_chapter_name])
         return bid, summary, chapter, book_parquet_ref
 
     def get_booksum_by_index(self, ix):
-        book = self.booksum.iloc[ix][['bid', 'summary', 'chapter']]
-
-        summary_dict = book['summary']
-        summary = json.loads(summary_dict)['summary']
-
-        chapter = book['chapter']
-
+        _, summary, chapter, _ = self._row(ix)
         return summary, chapter, ix
 
     def get_booksum_by_bid(self, bid):
-        idx = self.booksum[self.booksum['bid'] == bid].iloc[0].name
-
-        book = self.booksum.iloc[idx][['bid', 'summary', 'chapter']]
-
-        summary_dict = book['summary']
-        summary = json.loads(summary_dict)['summary']
+        _, summary, chapter, idx = self._row(self._rows_by_bid[bid])
+        return summary, chapter, idx
 
-        chapter = book['chapter']
 
-        return summary, chapter, idx
+def _first_rows(values) -> dict:
+    rows = {}
+    for row, value in enumerate(values):
+        rows.setdefault(value, row)
+    return rows
 
 
 def to_pickle(obj, file_path):
@@ -62,8 +92,35 @@ def to_parquet(df, file_path):
     df.to_parquet(file_path, engine='pyarrow')
 
 
-def load_parquet(file_path):
-    return pd.read_parquet(file_path, engine='pyarrow')
+def load_parquet(file_path, columns=None):
+    return pd.read_parquet(file_path, engine='pyarrow', columns=columns)
+
+
+def iter_parquet_records(file_path, columns, batch_size=64, rows=None, contains=None):
+    """Yields the rows of a Parquet file as dicts, one record batch at a time
+
+    Only `columns` are read, so memory is bounded by `batch_size` rows of those columns rather than by the file.
+
+    Args:
+        file_path (str): Parquet file
+        columns (list): columns to read
+        batch_size (int): maximum number of rows held in memory
+        rows (Iterable[int]): positions of the rows to keep (all rows when None)
+        contains (tuple): (column, substring) filter pushed down to the scan
+    """
+    dataset = ds.dataset(file_path, format='parquet')
+    scan_filter = pc.match_substring(ds.field(contains[0]), contains[1]) if contains else None
+    rows = None if rows is None else set(rows)
+
+    offset = 0
+    for batch in dataset.to_batches(columns=columns, filter=scan_filter, batch_size=batch_size):
+        if rows is None:
+            yield from batch.to_pylist()
+        else:
+            selected = [row - offset for row in range(offset, offset + batch.num_rows) if row in rows]
+            if selected:
+                yield from batch.take(selected).to_pylist()
+        offset += batch.num_rows
 
 
 # -------------------------------------------
@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+JOB_KINDS = ('book-title', 'book-passage')
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+# longest wait of a worker between failed claims
+MAX_BACKOFF_SECONDS = 30.0
+
+
+class JobStore:
+    """SQLite-backed summarization jobs
+
+    Jobs survive restarts: the ones that were running when the process stopped are queued again. Several
+    processes may drain the same store (a job is claimed by a single one).
+    """
+
+    def __init__(self, path: str, requeue_running: bool = True):
+        """
+        Args:
+            path (str): SQLite file
+            requeue_running (bool): queue the running jobs again (only when no other process is draining the store)
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, content TEXT NOT NULL, mode TEXT NOT NULL, "
+            "status TEXT NOT NULL, result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created_at ON jobs (status, created_at)")
+        if requeue_running:
+            self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+        self._db.commit()
+
+    def submit(self, kind: str, content: str, mode: str) -> str:
+        if kind not in JOB_KINDS:
+            raise ValueError(f"{kind} is not part of {JOB_KINDS}")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, content, mode, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, content, mode, now, now)
+            )
+            self._db.commit()
+
+        return job_id
+
+    def claim_next(self) -> dict | None:
+        """Marks the oldest queued job as running and returns it"""
+        with self._lock:
+            while True:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+
+                # another process may have claimed it in between
+                claimed = self._db.execute(
+                    "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                    (time.time(), row['id'])
+                ).rowcount
+                self._db.commit()
+                if claimed:
+                    break
+
+        return dict(row)
+
+    def finish(self, job_id: str, result: dict = None, error: str = None) -> None:
+        status = 'failed' if error is not None else 'done'
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+            self._db.commit()
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, mode, status, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+
+class JobWorkerPool:
+    """Fixed number of worker threads draining a `JobStore` with a `BookSummarizer`"""
+
+    def __init__(self, store: JobStore, model, workers: int = 2, poll_interval: float = 1.0, logger=None):
+        self.store = store
+        self.model = model
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._threads = []
+
+    def start(self) -> None:
+        for ix in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"summarization-worker-{ix}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None) -> None:
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        """Wakes an idle worker up after a job was submitted"""
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def _wait(self, timeout: float) -> None:
+        with self._wakeup:
+            if not self._stopping:
+                self._wakeup.wait(timeout)
+
+    def _run(self) -> None:
+        # the store can fail transiently (e.g. "database is locked"): the worker backs off instead of dying
+        failures = 0
+        while not self._stopping:
+            try:
+                job = self.store.claim_next()
+            except Exception:
+                failures += 1
+                self.logger.warning(f"Claiming a job failed ({failures} in a row), retrying...\n"
+                                    f"{traceback.format_exc()}")
+                self._wait(min(self.poll_interval * 2 ** failures, MAX_BACKOFF_SECONDS))
+                continue
+
+            failures = 0
+            if job is None:
+                self._wait(self.poll_interval)
+                continue
+
+            try:
+                result = self._summarize(job)
+            except Exception:
+                self.logger.warning(f"Job {job['id']} failed")
+                self._finish(job['id'], error=traceback.format_exc())
+            else:
+                self._finish(job['id'], result=result)
+
+    def _finish(self, job_id: str, **outcome) -> None:
+        try:
+            self.store.finish(job_id, **outcome)
+        except Exception:
+            # the job stays running until the store is reopened and requeues it
+            self.logger.warning(f"Recording the outcome of job {job_id} failed\n{traceback.format_exc()}")
+
+    def _summarize(self, job: dict) -> dict:
+        if job['kind'] == 'book-title':
+            return self.model.summarize_given_book_title(job['content'], job['mode'])
+
+        return self.model.summarize_given_text(job['content'], job['mode'])
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from booksum.utils.instrumentation import timed
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used to reserve budget before a call."""
+    return len(text) // 4 + 1
+
+
+def is_rate_limit_error(ex: Exception) -> bool:
+    """True when the provider answered with HTTP 429 (e.g. `openai.RateLimitError` raised by Groq)."""
+    status_code = getattr(ex, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(ex, 'response', None), 'status_code', None)
+    return status_code == 429
+
+
+def _retry_after(ex: Exception) -> float | None:
+    headers = getattr(getattr(ex, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket continuously refilled at `rate` units per second up to `capacity`.
+
+    Not thread-safe on its own; `LLMRateLimiter` guards it with a lock.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.level = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float, rate_scale: float = 1.0) -> None:
+        elapsed = max(0.0, now - self.updated_at)
+        self.level = min(self.capacity, self.level + elapsed * self.rate * rate_scale)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, rate_scale: float = 1.0) -> float:
+        # requests larger than the bucket are let through once it is full (the level then goes negative)
+        needed = min(amount, self.capacity) - self.level
+        if needed <= 0:
+            return 0.0
+        return needed / (self.rate * rate_scale)
+
+
+class LLMRateLimiter:
+    """Process-wide requests/min and tokens/min limiter for LLM calls
+
+    Calls reserve budget from two token buckets and wait until both can pay for them, so bursts are
+    queued and released as budget frees up. A 429 from the provider pauses every caller for an
+    exponentially growing (or `Retry-After`) delay and halves the effective refill rate, which is then
+    recovered additively on each successful call.
+    """
+
+    def __init__(self,
+                 requests_per_minute: float = 30,
+                 tokens_per_minute: float = 6000,
+                 completion_tokens: int = 512,
+                 max_retries: int = 5,
+                 backoff_base: float = 2.0,
+                 backoff_max: float = 60.0,
+                 min_rate_scale: float = 0.1,
+                 rate_recovery: float = 0.05,
+                 logger=None):
+        """
+        Args:
+            requests_per_minute (float): sustained request budget
+            tokens_per_minute (float): sustained token budget (prompt + completion)
+            completion_tokens (int): tokens reserved for the completion of each call
+            max_retries (int): retries of a call answered with a 429
+            backoff_base (float): base of the exponential backoff, in seconds
+            backoff_max (float): upper bound of a single backoff, in seconds
+            min_rate_scale (float): lower bound of the adaptive refill rate multiplier
+            rate_recovery (float): increase of the refill rate multiplier after each successful call
+        """
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self.completion_tokens = completion_tokens
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.min_rate_scale = min_rate_scale
+        self.rate_recovery = rate_recovery
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._rate_scale = 1.0
+        self._blocked_until = 0.0
+        self._consecutive_429 = 0
+
+    # -------------------------------------
+    # budget
+    def _reserve(self, tokens: int) -> float:
+        """Consumes the budget for one call and returns 0, or returns how long to wait before retrying."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+
+            self.requests.refill(now, self._rate_scale)
+            self.tokens.refill(now, self._rate_scale)
+            wait = max(
+                self.requests.wait_time(1, self._rate_scale),
+                self.tokens.wait_time(tokens, self._rate_scale)
+            )
+            if wait > 0:
+                return wait
+
+            self.requests.level -= 1
+            self.tokens.level -= tokens
+            return 0.0
+
+    @timed('rate_limiter_wait')
+    def acquire(self, prompt_tokens: int) -> None:
+        tokens = prompt_tokens + self.completion_tokens
+        while (wait := self._reserve(tokens)) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, prompt_tokens: int) -> None:
+        tokens = prompt_tokens + self.completion_tokens
+        with timed('rate_limiter_wait'):
+            while (wait := self._reserve(tokens)) > 0:
+                await asyncio.sleep(wait)
+
+    def settle(self, reserved_tokens: int, used_tokens: int | None) -> None:
+        """Gives back (or charges) the difference between the reserved and the reported token usage."""
+        if used_tokens is None:
+            return
+        with self._lock:
+            delta = reserved_tokens + self.completion_tokens - used_tokens
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + delta)
+
+    # -------------------------------------
+    # adaptive backoff
+    def on_success(self) -> None:
+        with self._lock:
+            self._consecutive_429 = 0
+            self._rate_scale = min(1.0, self._rate_scale + self.rate_recovery)
+
+    def on_rate_limited(self, ex: Exception) -> float:
+        with self._lock:
+            self._consecutive_429 += 1
+            self._rate_scale = max(self.min_rate_scale, self._rate_scale / 2)
+            delay = _retry_after(ex)
+            if delay is None:
+                delay = min(self.backoff_max, self.backoff_base ** self._consecutive_429)
+                delay += random.uniform(0, delay / 10)
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+
+        self.logger.warning(f"LLM provider rate limit hit, backing off {delay:.1f}s "
+                            f"(rate scale {self._rate_scale:.2f})")
+        return delay
+
+    # -------------------------------------
+    # guarded calls
+    def call(self, fn, prompt_tokens: int):
+        """Runs `fn()` once budget is available, retrying it on 429 responses."""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(prompt_tokens)
+            try:
+                result = fn()
+            except Exception as ex:
+                if not is_rate_limit_error(ex) or attempt == self.max_retries:
+                    raise
+                self.on_rate_limited(ex)
+                continue
+            self.on_success()
+            return result
+
+    async def acall(self, fn, prompt_tokens: int):
+        """Awaits `fn()` once budget is available, retrying it on 429 responses."""
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(prompt_tokens)
+            try:
+                result = await fn()
+            except Exception as ex:
+                if not is_rate_limit_error(ex) or attempt == self.max_retries:
+                    raise
+                self.on_rate_limited(ex)
+                continue
+            self.on_success()
+            return result
+
+
+_rate_limiter: LLMRateLimiter | None = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter(cfg: dict | None = None, logger=None) -> LLMRateLimiter:
+    """Returns the process-wide limiter, creating it from `cfg` on first use."""
+    global _rate_limiter
+
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = LLMRateLimiter(**(cfg or {}), logger=logger)
+        return _rate_limiter
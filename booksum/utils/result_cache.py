@@ -0,0 +1,132 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from booksum.utils.hash import get_file_hash
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r'\s+', ' ', prompt).strip().casefold()
+
+
+class SummaryResultCache:
+    """Two-tier summary cache
+
+    An in-memory LRU in front of a SQLite store, both with TTL-based expiry and a bounded number of
+    entries. Keys are built with `make_key`, so entries of a rebuilt index are never served.
+    """
+
+    def __init__(self,
+                 path: str,
+                 memory_entries: int = 256,
+                 disk_entries: int = 10000,
+                 ttl_seconds: float = None,
+                 logger=None):
+        """
+        Args:
+            path (str): SQLite file of the on-disk tier
+            memory_entries (int): maximum number of entries kept in memory
+            disk_entries (int): maximum number of entries kept on disk
+            ttl_seconds (float): entries older than this are ignored and evicted (None to keep them)
+        """
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS summaries_accessed_at ON summaries (accessed_at)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(prompt: str, mode: str, model_name: str, index_fingerprint: str) -> str:
+        return get_file_hash("\x1f".join([normalize_prompt(prompt), mode, model_name, index_fingerprint]))
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+            row = self._db.execute("SELECT value, created_at FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None or self._expired(row[1], now):
+                self._counters['misses'] += 1
+                return None
+
+            self._db.execute("UPDATE summaries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._remember(key, row[0], row[1])
+            self._counters['disk_hits'] += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO summaries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._evict_disk(now)
+            self._db.commit()
+
+    def _remember(self, key: str, value: str, created_at: float) -> None:
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _evict_disk(self, now: float) -> None:
+        evicted = 0
+        if self.ttl_seconds is not None:
+            evicted += self._db.execute(
+                "DELETE FROM summaries WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+
+        overflow = self._db.execute("SELECT COUNT(*) FROM summaries").fetchone()[0] - self.disk_entries
+        if overflow > 0:
+            evicted += self._db.execute(
+                "DELETE FROM summaries WHERE key IN "
+                "(SELECT key FROM summaries ORDER BY accessed_at ASC LIMIT ?)", (overflow,)
+            ).rowcount
+        self._counters['evictions'] += evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM summaries")
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._memory)
+            stats['disk_entries'] = self._db.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,185 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from booksum.utils.result_cache import normalize_prompt
+
+
+class SemanticQueryCache:
+    """Summaries of previous queries, served to the queries whose embedding is close enough
+
+    Paraphrases of a request ("Pride and Prejudice", "pride & prejudice summary") miss the exact result cache.
+    Here the query (a book title or text, not the prompt built from it) is embedded and compared with the cached
+    queries of the same scope (kind of query, mode, model...), or of the scopes sharing a prefix (e.g. the titles
+    of any book); the response of the most similar one is served when their cosine similarity reaches `threshold`. Entries are persisted in SQLite and searched in memory,
+    bounded to `max_entries` (stale entries, then the least recently used ones, are evicted first). Entries
+    answered from another index than the loaded one are marked stale by `mark_stale` and never served.
+    """
+
+    def __init__(self,
+                 path: str,
+                 embed,
+                 threshold: float = 0.92,
+                 max_entries: int = 2048,
+                 logger=None):
+        """
+        Args:
+            path (str): SQLite file of the entries
+            embed (callable): embedding of a query (e.g. `Settings.embed_model.get_query_embedding`)
+            threshold (float): minimum cosine similarity between a query and a cached one to serve its response
+            max_entries (int): maximum number of entries
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.logger = logger or logging.getLogger(__name__)
+        # a query is embedded once for its lookup and its insertion
+        self._embed = lru_cache(maxsize=256)(lambda query: self._normalized(embed(query)))
+
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        # entry id -> (scope, index fingerprint, response, stale), in least recently used order
+        self._entries = OrderedDict()
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._embeddings = None
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS queries ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, scope TEXT NOT NULL, query TEXT NOT NULL, "
+            "index_fingerprint TEXT NOT NULL, embedding BLOB NOT NULL, response TEXT NOT NULL, "
+            "stale INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._load()
+
+    @staticmethod
+    def _normalized(embedding) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        return embedding / (np.linalg.norm(embedding) or 1.0)
+
+    def _load(self) -> None:
+        rows = self._db.execute(
+            "SELECT id, scope, index_fingerprint, response, stale, embedding FROM queries ORDER BY accessed_at"
+        ).fetchall()
+        for entry_id, scope, index_fingerprint, response, stale, _ in rows:
+            self._entries[entry_id] = (scope, index_fingerprint, response, bool(stale))
+        self._ids = np.asarray([row[0] for row in rows], dtype=np.int64)
+        if rows:
+            self._embeddings = np.stack([np.frombuffer(row[5], dtype=np.float32) for row in rows])
+
+    def _match(self, embedding: np.ndarray, scope: str, index_fingerprint: str,
+               match_prefix: bool = False) -> int | None:
+        """Id of the most similar servable entry above the threshold (marked as used), if any"""
+        if self._embeddings is None:
+            return None
+
+        similarities = self._embeddings @ embedding
+        for row in np.argsort(-similarities):
+            if similarities[row] < self.threshold:
+                return None
+
+            entry_id = int(self._ids[row])
+            entry_scope, entry_fingerprint, _, stale = self._entries[entry_id]
+            in_scope = entry_scope.startswith(scope) if match_prefix else entry_scope == scope
+            if in_scope and entry_fingerprint == index_fingerprint and not stale:
+                self._entries.move_to_end(entry_id)
+                self._db.execute("UPDATE queries SET accessed_at = ? WHERE id = ?", (time.time(), entry_id))
+                self._db.commit()
+                return entry_id
+
+        return None
+
+    def get(self, query: str, scope: str, index_fingerprint: str, match_prefix: bool = False) -> str | None:
+        """Response of the most similar cached query of `scope` answered from `index_fingerprint`, if any
+
+        Args:
+            match_prefix (bool): match the cached queries of every scope starting with `scope`
+        """
+        embedding = self._embed(normalize_prompt(query))
+        with self._lock:
+            entry_id = self._match(embedding, scope, index_fingerprint, match_prefix)
+            if entry_id is None:
+                self._counters['misses'] += 1
+                return None
+
+            self._counters['hits'] += 1
+            return self._entries[entry_id][2]
+
+    def put(self, query: str, scope: str, index_fingerprint: str, response: str) -> None:
+        embedding = self._embed(normalize_prompt(query))
+        now = time.time()
+        with self._lock:
+            # already answered (by a concurrent request)
+            if self._match(embedding, scope, index_fingerprint) is not None:
+                return
+
+            entry_id = self._db.execute(
+                "INSERT INTO queries (scope, query, index_fingerprint, embedding, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (scope, query, index_fingerprint, embedding.tobytes(), response, now, now)
+            ).lastrowid
+
+            self._entries[entry_id] = (scope, index_fingerprint, response, False)
+            self._ids = np.append(self._ids, entry_id)
+            self._embeddings = (
+                embedding[None, :] if self._embeddings is None else np.vstack([self._embeddings, embedding])
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        overflow = len(self._entries) - self.max_entries
+        if overflow <= 0:
+            return
+
+        stale = [entry_id for entry_id, entry in self._entries.items() if entry[3]]
+        evicted = (stale + [entry_id for entry_id, entry in self._entries.items() if not entry[3]])[:overflow]
+        for entry_id in evicted:
+            del self._entries[entry_id]
+        self._db.executemany("DELETE FROM queries WHERE id = ?", [(entry_id,) for entry_id in evicted])
+
+        keep = ~np.isin(self._ids, evicted)
+        self._ids = self._ids[keep]
+        self._embeddings = self._embeddings[keep] if keep.any() else None
+        self._counters['evictions'] += len(evicted)
+
+    def mark_stale(self, index_fingerprint: str) -> int:
+        """Marks the entries answered from another index than `index_fingerprint` as stale (after a rebuild)"""
+        with self._lock:
+            marked = self._db.execute(
+                "UPDATE queries SET stale = 1 WHERE index_fingerprint != ? AND stale = 0", (index_fingerprint,)
+            ).rowcount
+            self._db.commit()
+            for entry_id, (scope, entry_fingerprint, response, stale) in self._entries.items():
+                if entry_fingerprint != index_fingerprint:
+                    self._entries[entry_id] = (scope, entry_fingerprint, response, True)
+
+        if marked:
+            self.logger.warning(f"Semantic query cache: {marked} entries of a previous index marked stale.")
+        return marked
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._ids = np.zeros(0, dtype=np.int64)
+            self._embeddings = None
+            self._db.execute("DELETE FROM queries")
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+            stats['stale_entries'] = sum(entry[3] for entry in self._entries.values())
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
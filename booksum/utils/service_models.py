@@ -1,18 +1,106 @@
-from booksum.summarizer.booksummarizer import BookSummarizer
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+
+from booksum.utils.io_ops import get_settings
+
+BOOKS_CFG_KB_FILEPATH = 'config/books_to_process.yaml'
+
+
+def _build_index(root_path: str) -> None:
+    BookSumIndex(root_path, logger=logging.getLogger()).load_all_models()
+
+
+def prepare_shared_index(root_path: str) -> None:
+    """Builds (or updates) the index and its snapshot once, before worker processes load it read-only
+
+    It runs in a child process, so the parent (the supervisor of the workers) does not keep the models in memory.
+    """
+    process = multiprocessing.get_context('spawn').Process(target=_build_index, args=(root_path,))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Preparing the index failed (exit code {process.exitcode})")
 
 
 # class to load models
 class BookSumIndex:
-    def __init__(self, root_path, logger):
+    def __init__(self, root_path, logger, workers: int = 1):
+        """
+        Args:
+            root_path (str): root directory of the config, data and models
+            workers (int): processes serving the app; with more than one, the index prepared by
+                `prepare_shared_index` is loaded read-only (memory-mapped embeddings and node snapshot) and the LLM
+                rate limit and embedding threads are split between the processes
+        """
         self.model = None
         self.root_path = root_path
         self.logger = logger
+        self.workers = workers
+
+        # loading progress, reported by the readiness probe
+        self.stage = 'starting'
+        self.error = None
+        self._started_at = time.monotonic()
+        self._loaded_in = None
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None
+
+    def _set_stage(self, stage: str) -> None:
+        self.stage = stage
+        self.logger.warning(f"Loading models: {stage}...")
+
+    def _worker_cfg(self) -> dict:
+        """Summarizer settings of one of `workers` processes sharing the provider quota and the cpus"""
+        cfg = get_settings(self.root_path)['booksum_summarizer']
+
+        rate_limiter_cfg = cfg['rate_limiter']
+        rate_limiter_cfg['requests_per_minute'] = rate_limiter_cfg['requests_per_minute'] / self.workers
+        rate_limiter_cfg['tokens_per_minute'] = rate_limiter_cfg['tokens_per_minute'] / self.workers
+
+        embedding_cfg = cfg.setdefault('embedding', {})
+        if not embedding_cfg.get('num_threads'):
+            embedding_cfg['num_threads'] = max(1, (os.cpu_count() or 1) // self.workers)
+
+        vector_store_cfg = cfg.get('vector_store', {})
+        if vector_store_cfg.get('type') != 'mmap' or not vector_store_cfg.get('snapshot', False):
+            self.logger.warning("Without the mmap vector store and its snapshot, every worker holds a copy of the "
+                                "index.")
+
+        return cfg
 
     def load_all_models(self) -> None:
-        self.model = BookSummarizer(
-            logger=self.logger,
-            root_path=self.root_path,
-            books_cfg_kb_filepath='config/books_to_process.yaml',
-            frac=1,
-            with_literacy=True
-        )
+        try:
+            # the heavy stacks (llama-index, torch, sentence-transformers, groq) are only imported here
+            self._set_stage('importing')
+            from booksum.summarizer.booksummarizer import BookSummarizer
+
+            self.model = BookSummarizer(
+                logger=self.logger,
+                root_path=self.root_path,
+                books_cfg_kb_filepath=BOOKS_CFG_KB_FILEPATH,
+                frac=1,
+                with_literacy=True,
+                cfg=self._worker_cfg() if self.workers > 1 else None,
+                on_progress=self._set_stage,
+                read_only=self.workers > 1
+            )
+        except Exception:
+            self.error = traceback.format_exc()
+            self.stage = 'failed'
+            raise
+
+        self._loaded_in = time.monotonic() - self._started_at
+        self.stage = 'ready'
+
+    def progress(self) -> dict:
+        return {
+            "status": "ready" if self.ready else ("failed" if self.error else "loading"),
+            "stage": self.stage,
+            "elapsed_s": self._loaded_in if self.ready else time.monotonic() - self._started_at,
+            "error": self.error,
+        }
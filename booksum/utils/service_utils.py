@@ -1,19 +1,28 @@
+import json
+
+import httpx
 import requests
 
-_api_url_by_book_title = "http://localhost:8001/summarize/"
-_api_url_by_book_passage = "http://localhost:8001/summarize_text/"
+_api_url_by_book_title = "http://localhost:8001/summarize"
+_api_url_by_book_passage = "http://localhost:8001/summarize_text"
+_api_url_stream_by_book_title = "http://localhost:8001/summarize/stream"
+_api_url_stream_by_book_passage = "http://localhost:8001/summarize_text/stream"
 
 
-def book_summary_api(data=None, given: str = None):
+def _api_url_given(given: str, stream: bool = False) -> str:
     types = ["book-title", "book-passage"]
 
     if given not in types:
         raise ValueError(f"{given} is not part of {types}")
 
     if given == 'book-title':
-        _api_url = _api_url_by_book_title
+        return _api_url_stream_by_book_title if stream else _api_url_by_book_title
     else:
-        _api_url = _api_url_by_book_passage
+        return _api_url_stream_by_book_passage if stream else _api_url_by_book_passage
+
+
+def book_summary_api(data=None, given: str = None):
+    _api_url = _api_url_given(given)
 
     # make request
     response = requests.post(_api_url, json=data)
@@ -23,3 +32,30 @@ def book_summary_api(data=None, given: str = None):
     else:
         # todo: should raise an error
         return None
+
+
+async def abook_summary_api(client: httpx.AsyncClient, data=None, given: str = None) -> dict:
+    """Async `book_summary_api` through a shared (pooled) client, raises on HTTP errors"""
+    response = await client.post(_api_url_given(given), json=data)
+    response.raise_for_status()
+    return response.json()
+
+
+def book_summary_stream_api(data=None, given: str = None):
+    """Yields the summary tokens sent by the streaming endpoints (server-sent events)"""
+    _api_url = _api_url_given(given, stream=True)
+
+    with requests.post(_api_url, json=data, stream=True) as response:
+        response.raise_for_status()
+
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                payload = json.loads(line[len("data:"):])
+                if event == "done":
+                    return
+                if event == "error":
+                    raise RuntimeError(payload)
+                yield payload
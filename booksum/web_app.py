@@ -1,6 +1,6 @@
 import streamlit as st
 
-from booksum.utils.service_utils import book_summary_api
+from booksum.utils.service_utils import book_summary_stream_api
 
 def main():
 
@@ -18,19 +18,16 @@ def main():
 
     if st.button("Summarize"):
         if query:
-            results = book_summary_api({"book": query}, given='book-title')
-
-            # which result will be displayed to the end user
-            if options == 'LLM':
-                results = results['base-response']
-            elif options == 'LLM+RAG':
-                results = results['simple-rag']
+            # only ask the service for the response that will be displayed to the end user
+            if options == 'LLM+RAG':
+                mode = 'rag'
             else:
-                # invalid option for some unknown reason
-                results = results['base-response']
+                # LLM or no option selected
+                mode = 'base'
 
             st.write(f"Results for: {query}")
-            st.write(results)
+            # render the summary as its tokens arrive
+            st.write_stream(book_summary_stream_api({"book": query, "mode": mode}, given='book-title'))
         else:
             st.write("Please enter a query to search.")
 
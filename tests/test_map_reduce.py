@@ -0,0 +1,49 @@
+import random
+from types import SimpleNamespace
+
+from booksum.summarizer.map_reduce import MapReduceSummarizer
+from booksum.utils.result_cache import SummaryResultCache
+
+WORDS = "the king rode north with his men while the queen kept the castle and the river rose".split()
+
+
+def _text(seed: int, paragraphs: int = 120) -> list:
+    rng = random.Random(seed)
+    return [
+        " ".join(
+            " ".join(rng.choices(WORDS, k=rng.randint(6, 18))).capitalize() + "."
+            for _ in range(rng.randint(2, 6))
+        )
+        for _ in range(paragraphs)
+    ]
+
+
+def _chunk_keys(summarizer: MapReduceSummarizer, text: str) -> list:
+    return [SummaryResultCache.make_key(chunk, 'chunk', 'model', '') for chunk in summarizer.split(text)]
+
+
+def test_split_fits_the_budget_and_keeps_the_text():
+    summarizer = MapReduceSummarizer(SimpleNamespace(model='model'), chunk_tokens=300, threshold_tokens=300)
+    paragraphs = _text(seed=1)
+
+    chunks = summarizer.split("\n\n".join(paragraphs))
+
+    assert len(chunks) > 1
+    assert all(summarizer.count_tokens(chunk) <= summarizer.chunk_tokens for chunk in chunks)
+    assert " ".join(chunks).split() == " ".join(paragraphs).split()
+
+
+def test_edit_in_the_first_chunk_leaves_the_later_chunk_keys_unchanged():
+    summarizer = MapReduceSummarizer(SimpleNamespace(model='model'), chunk_tokens=300, threshold_tokens=300)
+    paragraphs = _text(seed=2)
+    original = _chunk_keys(summarizer, "\n\n".join(paragraphs))
+
+    # a sentence inserted in the first paragraph shifts the offsets of the whole text
+    edited = [f"A messenger arrived at dawn. {paragraphs[0]}"] + paragraphs[1:]
+    keys = _chunk_keys(summarizer, "\n\n".join(edited))
+
+    # the edited chunk may end at a new anchor (two chunks), the following ones are unchanged
+    changed = len(keys) - (len(original) - 1)
+    assert 1 <= changed <= 2
+    assert original[0] not in keys
+    assert keys[changed:] == original[1:]
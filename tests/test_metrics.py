@@ -0,0 +1,42 @@
+import pandas as pd
+
+from booksum.summarizer.metrics import MetricsEngine, METRICS_COLUMNS
+
+SUMMARIES = [
+    "Elizabeth Bennet meets Mr. Darcy at a ball in Hertfordshire and takes an instant dislike to his pride.",
+    "Captain Wentworth returns to Bath eight years after Anne Elliot was persuaded to refuse his proposal.",
+]
+
+
+def test_score_returns_sample_and_aggregate_rows():
+    results = pd.DataFrame({
+        'ref': ['pride', 'persuasion'],
+        'summary': SUMMARIES,
+        'base-response': SUMMARIES,
+        'simple-rag': ["", SUMMARIES[1]],
+    })
+
+    scores = MetricsEngine(metric_names=('bleu',), n_jobs=1).score(results)
+
+    assert list(scores.columns) == METRICS_COLUMNS
+    samples = scores[scores['scope'] == 'sample'].set_index(['ref', 'response_type'])['score']
+    assert len(samples) == 4
+    assert samples[('pride', 'base-response')] == 1.0
+    assert samples[('persuasion', 'base-response')] == 1.0
+    # an empty prediction scores 0 instead of failing on the brevity penalty
+    assert samples[('pride', 'simple-rag')] == 0.0
+
+    aggregates = scores[scores['scope'] == 'aggregate'].set_index('response_type')
+    assert set(aggregates['metric']) == {'bleu'}
+    assert aggregates['ref'].isna().all()
+    assert aggregates.loc['base-response', 'score'] == 1.0
+    # corpus BLEU: perfect n-gram precision, penalized for the missing (empty) prediction
+    assert 0.0 < aggregates.loc['simple-rag', 'score'] < 1.0
+
+
+def test_score_of_empty_predictions_only():
+    results = pd.DataFrame({'ref': ['pride'], 'summary': SUMMARIES[:1], 'base-response': [None], 'simple-rag': [""]})
+
+    scores = MetricsEngine(metric_names=('bleu',), n_jobs=1).score(results)
+
+    assert (scores['score'] == 0.0).all()
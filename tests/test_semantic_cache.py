@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+from booksum.summarizer.booksummarizer import BookSummarizer
+from booksum.summarizer.title_index import TitleIndex, normalize_title
+from booksum.utils.semantic_cache import SemanticQueryCache
+
+BOOK_WORDS = ['pride', 'prejudice', 'sense', 'sensibility', 'emma']
+
+
+def _embed(query: str) -> list:
+    """Stands in for the embedding model: the book words dominate the request words around them"""
+    words = normalize_title(query).split()
+    return [words.count(word) for word in BOOK_WORDS] + [0.2 * sum(word not in BOOK_WORDS for word in words)]
+
+
+def _summarizer(tmp_path) -> BookSummarizer:
+    # only the cache lookups are exercised: no models nor index
+    summarizer = BookSummarizer.__new__(BookSummarizer)
+    summarizer.llm = SimpleNamespace(model='model')
+    summarizer.index_fingerprint = 'index'
+    summarizer.result_cache = None
+    summarizer.semantic_cache_cfg = {'kinds': ['title']}
+    summarizer.semantic_cache = SemanticQueryCache(str(tmp_path / 'semantic_queries.sqlite'), embed=_embed)
+    summarizer.title_index = TitleIndex({'pride and prejudice': ['Pride and Prejudice'],
+                                         'sense and sensibility': ['Sense and Sensibility']})
+    return summarizer
+
+
+def _cached(summarizer: BookSummarizer, title: str) -> dict:
+    doc_ids = summarizer.title_index.resolve(title)
+    return summarizer._cached_responses(summarizer._book_title_prompt(title), ['base', 'rag'], ('title', title),
+                                        doc_ids)
+
+
+def test_paraphrases_of_a_title_are_served_its_cached_summary(tmp_path):
+    summarizer = _summarizer(tmp_path)
+    title = "Pride and Prejudice"
+    summarizer._cache_responses(summarizer._book_title_prompt(title), {'base': "base", 'rag': "rag"},
+                                ('title', title), summarizer.title_index.resolve(title))
+
+    for paraphrase in ["pride & prejudice summary", "pride and prejudice summary",
+                       "summarize pride and prejudice by austen"]:
+        # too far from the catalog title to be resolved by the title index, matched by their embedding
+        assert summarizer.title_index.resolve(paraphrase) is None
+        assert _cached(summarizer, paraphrase) == {'base': "base", 'rag': "rag"}
+
+
+def test_other_books_are_not_served_the_cached_summary(tmp_path):
+    summarizer = _summarizer(tmp_path)
+    title = "Pride and Prejudice"
+    summarizer._cache_responses(summarizer._book_title_prompt(title), {'base': "base", 'rag': "rag"},
+                                ('title', title), summarizer.title_index.resolve(title))
+
+    assert _cached(summarizer, "Sense and Sensibility") == {}
+    assert _cached(summarizer, "summarize emma by austen") == {}
+    assert summarizer.semantic_cache.stats()['hits'] == 0
@@ -0,0 +1,37 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from booksum.service import app
+from booksum.utils.service_utils import abook_summary_api
+
+
+class StubSummarizer:
+    """Answers the summarization routes without loading the models or the index"""
+
+    async def asummarize_given_book_title(self, book_title: str, mode: str = 'both') -> dict:
+        return {'base-response': f"summary of {book_title}", 'simple-rag': f"summary of {book_title}"}
+
+    async def asummarize_given_text(self, text: str, mode: str = 'both') -> dict:
+        return {'base-response': f"summary of {text}", 'simple-rag': f"summary of {text}"}
+
+
+@pytest.mark.parametrize("given, data, content", [
+    ('book-title', {"book": "Emma"}, "Emma"),
+    ('book-passage', {"book_text": "A short passage."}, "A short passage."),
+])
+def test_abook_summary_api_reaches_the_routes(monkeypatch, given, data, content):
+    # the app is served in-process: the lifespan (model loading) does not run
+    monkeypatch.setattr(app.state, 'models', SimpleNamespace(ready=True, model=StubSummarizer()), raising=False)
+
+    async def request():
+        # redirects are not followed, as by the evaluation client
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app)) as client:
+            return await abook_summary_api(client, data, given)
+
+    response = asyncio.run(request())
+
+    assert response['base-response'] == f"summary of {content}"
+    assert response['simple-rag'] == f"summary of {content}"